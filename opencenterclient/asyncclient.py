@@ -0,0 +1,175 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Concurrent counterpart to OpenCenterEndpoint.
+
+Everything that would make a request returns a Future instead, and the
+requests run on a bounded worker pool sharing the endpoint's pooled
+session, so fetches of schemas, collections and objects overlap:
+
+    ep = AsyncOpenCenterEndpoint('http://localhost:8080')
+    nodes, tasks = gather([ep.nodes.values(), ep.tasks.values()])
+    some_nodes = ep.nodes.get_many([1, 2, 3]).result()
+"""
+
+from client import OpenCenterEndpoint, singularize
+from pool import WorkerPool, gather, as_completed, when_all
+
+__all__ = ['AsyncOpenCenterEndpoint', 'AsyncLazyDict', 'gather',
+           'as_completed', 'when_all']
+
+
+class AsyncLazyDict(object):
+    def __init__(self, endpoint, lazy_dict):
+        self.endpoint = endpoint
+        self.lazy_dict = lazy_dict
+        self.object_type = lazy_dict.object_type
+
+    def _submit(self, fn, *args, **kwargs):
+        return self.endpoint.submit(fn, *args, **kwargs)
+
+    def __getitem__(self, key):
+        return self._submit(self.lazy_dict.__getitem__, key)
+
+    def get_many(self, keys):
+        """Fetch several objects by id at once.
+
+        The result is a list in the same order as keys.
+        """
+        return when_all([self[key] for key in keys])
+
+    def keys(self):
+        return self._submit(self.lazy_dict.keys)
+
+    def values(self):
+        return self._submit(self.lazy_dict.values)
+
+    def items(self):
+        return self._submit(self.lazy_dict.items)
+
+    def first(self):
+        return self._submit(self.lazy_dict.first)
+
+    def filter(self, filter_string):
+        return AsyncLazyDict(self.endpoint,
+                             self.lazy_dict.filter(filter_string))
+
+    def bulk_create(self, items, **kwargs):
+        return self._submit(self.lazy_dict.bulk_create, items, **kwargs)
+
+    def bulk_update(self, updates, **kwargs):
+        return self._submit(self.lazy_dict.bulk_update, updates, **kwargs)
+
+    def bulk_delete(self, items, **kwargs):
+        return self._submit(self.lazy_dict.bulk_delete, items, **kwargs)
+
+    def new(self, **kwargs):
+        return self.lazy_dict.new(**kwargs)
+
+    def create(self, **kwargs):
+        return self.new(**kwargs)
+
+
+class AsyncOpenCenterEndpoint(object):
+    def __init__(self, endpoint=None, cert=None, opencenter_ca=None,
+                 user=None,
+                 password=None,
+                 interactive=False,
+                 pool_size=None,
+                 transport=None,
+                 max_workers=None,
+                 schema_cache=False,
+                 streaming=False,
+                 filter_cache=False,
+                 columnar=False,
+                 page_size=None):
+        self.sync = OpenCenterEndpoint(endpoint, cert, opencenter_ca,
+                                       user=user,
+                                       password=password,
+                                       interactive=interactive,
+                                       pool_size=pool_size,
+                                       transport=transport,
+                                       schema_cache=schema_cache,
+                                       streaming=streaming,
+                                       filter_cache=filter_cache,
+                                       columnar=columnar,
+                                       page_size=page_size)
+        if max_workers is None:
+            max_workers = self.sync._worker_count()
+        self.pool = WorkerPool(max_workers)
+        self._object_lists = dict(
+            (k, AsyncLazyDict(self, v))
+            for k, v in self.sync._object_lists.items())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, name):
+        return self._object_lists[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not name in self._object_lists:
+            raise AttributeError(
+                "'AsyncOpenCenterEndpoint' has no attribute '%s'" % name)
+        return self._object_lists[name]
+
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def get_objectlist(self):
+        return self._object_lists.keys()
+
+    def get_schema(self, object_type):
+        return self.submit(self.sync.get_schema, object_type)
+
+    def load_schemas(self, object_types=None):
+        """Fetch the schemas for several object types at once."""
+        if object_types is None:
+            object_types = [singularize(x) for x in self._object_lists]
+        return when_all([self.get_schema(x) for x in object_types])
+
+    def save(self, obj):
+        return self.submit(obj.save)
+
+    def delete(self, obj):
+        return self.submit(obj.delete)
+
+    def execute(self, adventure, plan_args=None, **kwargs):
+        return self.submit(adventure.execute, plan_args=plan_args, **kwargs)
+
+    def wait_for_complete(self, task, **kwargs):
+        def _wait():
+            task.wait_for_complete(**kwargs)
+            return task
+        return self.submit(_wait)
+
+    def wait_for_tasks(self, tasks, **kwargs):
+        """Wait on several tasks with one TaskWatcher; the result is the
+        tasks in the order they completed."""
+        return self.submit(self.sync.watch_tasks(tasks, **kwargs).wait)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
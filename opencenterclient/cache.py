@@ -0,0 +1,207 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+DEFAULT_SCHEMA_TTL = 300
+DEFAULT_FILTER_TTL = 30
+DEFAULT_FILTER_CACHE_SIZE = 128
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'opencenter')
+
+
+class SchemaCache(object):
+    """On-disk cache of the schema documents of one endpoint.
+
+    Entries younger than ttl seconds are used as-is.  Older entries are
+    revalidated with If-None-Match/If-Modified-Since, so an unchanged
+    schema only costs a 304.
+    """
+    def __init__(self, endpoint_url, cache_dir=None, ttl=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('OPENCENTER_SCHEMA_CACHE',
+                                       default_cache_dir())
+        if ttl is None:
+            ttl = float(os.environ.get('OPENCENTER_SCHEMA_CACHE_TTL',
+                                       DEFAULT_SCHEMA_TTL))
+        self.endpoint_url = endpoint_url
+        self.ttl = ttl
+        self.path = os.path.join(
+            cache_dir,
+            'schema-%s.json' % hashlib.sha1(endpoint_url).hexdigest())
+        self.logger = logging.getLogger('opencenter.endpoint')
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        if data.get('endpoint') != self.endpoint_url:
+            return {}
+        return data.get('entries', {})
+
+    def save(self):
+        # write to a temp file and rename, so concurrent clients never
+        # see half a cache file
+        try:
+            cache_dir = os.path.dirname(self.path)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'endpoint': self.endpoint_url,
+                           'entries': self.entries}, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            self.logger.debug('could not write schema cache %s: %s',
+                              self.path, e)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched'] < self.ttl
+
+    def validators(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, name, body, headers):
+        self.entries[name] = {'body': body,
+                              'etag': headers.get('etag'),
+                              'last_modified': headers.get('last-modified'),
+                              'fetched': time.time()}
+        self.save()
+
+    def touch(self, name):
+        self.entries[name]['fetched'] = time.time()
+        self.save()
+
+    def clear(self):
+        self.entries = {}
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+# quoted strings are kept as they are.  elsewhere, whitespace around
+# operators and parentheses goes, and any other run of it becomes a space
+_filter_part = re.compile(
+    r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|\s*([()=<>!,]+)\s*|\s+')
+
+
+def normalize_filter(filter_string):
+    def _part(match):
+        if match.group(1):
+            return match.group(1)
+        text = match.group(0)
+        return ' ' if text.isspace() else text
+    return _filter_part.sub(_part, filter_string.strip())
+
+
+class FilterCache(object):
+    """In-memory cache of filter views, by (type, filter string).
+
+    Asking for the same filter twice hands back the same LazyDict, so
+    its results are only fetched again once the view has been
+    invalidated by a write, or is older than ttl seconds.  At most
+    max_size views are kept, least recently used going first.
+    """
+    def __init__(self, ttl=None, max_size=None):
+        if ttl is None:
+            ttl = float(os.environ.get('OPENCENTER_FILTER_CACHE_TTL',
+                                       DEFAULT_FILTER_TTL))
+        if max_size is None:
+            max_size = int(os.environ.get('OPENCENTER_FILTER_CACHE_SIZE',
+                                          DEFAULT_FILTER_CACHE_SIZE))
+        self.ttl = ttl
+        self.max_size = max_size
+        self.views = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, object_type, filter_string):
+        key = (object_type, normalize_filter(filter_string))
+        with self._lock:
+            view = self.views.pop(key, None)
+            if view is None:
+                self.misses += 1
+                return None
+
+            # most recently used goes last
+            self.views[key] = view
+            if view.refreshed and \
+                    time.time() - view.refreshed_at > self.ttl:
+                view.dirty = True
+                self.expired += 1
+
+            if view.refreshed and not view.dirty:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return view
+
+    def put(self, object_type, filter_string, view):
+        key = (object_type, normalize_filter(filter_string))
+        with self._lock:
+            self.views.pop(key, None)
+            self.views[key] = view
+            while len(self.views) > self.max_size:
+                self.views.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'size': len(self.views)}
+
+    def clear(self):
+        with self._lock:
+            self.views.clear()
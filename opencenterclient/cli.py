@@ -31,6 +31,8 @@ import sys
 import time
 from pprint import pprint
 
+from waiter import COMPLETE_STATES, backoff_delays
+
 
 class OpenCenterCLI(cliapp.Application):
     def add_settings(self):
@@ -263,11 +265,12 @@ class OpenCenterCLI(cliapp.Application):
             print "\n--waiting for task to complete--"
             complete = False
             count = 0
+            delays = backoff_delays()
             while not complete:
                 count += 1
                 # do something
                 r = requests.get(self.urls['task'] + task_id)
-                if r.json['task']['state'] == 'done':
+                if r.json['task']['state'] in COMPLETE_STATES:
                     complete = True
                     sys.stdout.write('\n--task completed--\n\n')
                     sys.stdout.flush()
@@ -275,7 +278,7 @@ class OpenCenterCLI(cliapp.Application):
                 else:
                     sys.stdout.write('\r8%sD' % ('=' * count,))
                     sys.stdout.flush()
-                    time.sleep(3)
+                    time.sleep(next(delays))
 
 #    def cmd_task_delete(self, args):
 #        """Not Implemented: WONT FIX"""
@@ -24,81 +24,297 @@
 ##############################################################################
 
 import code
-import copy
+import hashlib
+import inspect
 import json
 import logging
 import os
+import re
+import StringIO
 import sys
+import threading
+import time
 import traceback
 import urlparse
+import weakref
 import requests
 from functools import partial
 
+import jsonstream
+from cache import FilterCache, SchemaCache
+from output import TableRenderer
+from pool import DEFAULT_WORKERS, WorkerPool
+from waiter import COMPLETE_STATES, LogFollower, TaskWaiter, TaskWatcher
 
-def ensure_json(f):
-    def wrap(*args, **kwargs):
-        r = f(*args, **kwargs)
-        if not hasattr(r, 'json'):
-            try:
-                r.__dict__['json'] = json.loads(r.content)
-            except ValueError:
-                r.json = None
-        if callable(r.json):
-            try:
-                r.json = r.json()
-            except ValueError:
-                r.json = None
-        if not hasattr(r, 'text'):
+
+# optional json libraries to try, fastest first. the stdlib json module
+# is always there as a fallback.
+JSON_DECODERS = ['ujson', 'simplejson', 'json']
+
+_json_loads = None
+
+
+def _import_json_decoder(name):
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    return getattr(module, 'loads', None)
+
+
+def set_json_decoder(decoder=None):
+    """Choose how response bodies are decoded.
+
+    decoder is a module name from JSON_DECODERS, a loads-style callable,
+    or None to pick the fastest installed library (or the one named by
+    OPENCENTER_JSON).
+    """
+    global _json_loads
+    if callable(decoder):
+        _json_loads = decoder
+        return
+
+    names = JSON_DECODERS
+    if decoder is not None:
+        names = [decoder]
+    elif 'OPENCENTER_JSON' in os.environ:
+        names = [os.environ['OPENCENTER_JSON'], 'json']
+
+    for name in names:
+        loads = _import_json_decoder(name)
+        if loads is not None:
+            _json_loads = loads
+            return
+    raise ValueError('json decoder "%s" is not available' % decoder)
+
+
+def json_loads(s):
+    if _json_loads is None:
+        set_json_decoder()
+    return _json_loads(s)
+
+
+class JSONResponse(object):
+    """A requests response whose body is decoded as json at most once,
+    the first time .json is used.  Everything else is passed through to
+    the underlying response."""
+    def __init__(self, response):
+        self.__dict__['response'] = response
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['response'], name)
+
+    @property
+    def json(self):
+        if not '_json' in self.__dict__:
             try:
-                setattr(r, 'text', r.content)
+                self.__dict__['_json'] = json_loads(self.response.content)
             except ValueError:
-                r.text = None
-        return r
+                self.__dict__['_json'] = None
+        return self.__dict__['_json']
+
+
+def response_validators(resp, **extra):
+    validators = dict(extra)
+    if resp.headers.get('etag'):
+        validators['etag'] = resp.headers['etag']
+    if resp.headers.get('last-modified'):
+        validators['last_modified'] = resp.headers['last-modified']
+    return validators
+
+
+def conditional_headers(validators):
+    headers = {}
+    if 'etag' in validators:
+        headers['If-None-Match'] = validators['etag']
+    if 'last_modified' in validators:
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def ensure_json(f):
+    def wrap(*args, **kwargs):
+        return JSONResponse(f(*args, **kwargs))
     return wrap
 
 
+DEFAULT_POOL_SIZE = 10
+
+_capabilities = None
+
+
+def _detect_capabilities():
+    session_cls = getattr(requests, 'Session', None)
+    try:
+        args = inspect.getargspec(session_cls.request).args
+    except (AttributeError, TypeError):
+        args = []
+
+    return {'version': getattr(requests, '__version__', None),
+            # pre-0.8 requests does not take verify= or cert=
+            'ssl_kwargs': 'verify' in args and 'cert' in args,
+            # requests >= 1.0 sizes pools on transport adapters
+            'adapters': hasattr(requests, 'adapters'),
+            # 1.x streams with stream=True, 0.x with prefetch=False
+            'stream_kwarg': 'stream' if 'stream' in args else 'prefetch'}
+
+
+def requests_capabilities():
+    """Work out what the installed requests library supports.
+
+    This only inspects the library, and is done once per process.
+    """
+    global _capabilities
+    if _capabilities is None:
+        _capabilities = _detect_capabilities()
+    return _capabilities
+
+
 class Requester(object):
     def __init__(self, cert=None, opencenter_ca=None,
-                 user=None, password=None):
+                 user=None, password=None, pool_size=None,
+                 log_format=None):
         if not cert:
             cert = os.environ.get('OPENCENTER_CERT', cert)
         if not opencenter_ca:
             opencenter_ca = os.environ.get('OPENCENTER_CA', opencenter_ca)
+        if pool_size is None:
+            pool_size = int(os.environ.get('OPENCENTER_POOL_SIZE',
+                                           DEFAULT_POOL_SIZE))
+        if log_format is None:
+            log_format = os.environ.get('OPENCENTER_LOG_FORMAT', 'curl')
         self.verify = not opencenter_ca is None
         self.cert = cert
+        self.pool_size = pool_size
+        self.log_format = log_format
         self.requests = requests
+        self.capabilities = requests_capabilities()
         self.logger = logging.getLogger('opencenter.endpoint')
+        self.request_count = 0
+        self._lock = threading.Lock()
         if user is not None and password is not None:
             auth = (user, password)
         else:
             auth = None
-        old = False
-        try:
-            requests.get("", verify=False)
-        except TypeError:
-            #old version of requests
-            old = True
-        except requests.exceptions.URLRequired:
-            #newer version
-            pass
-        except requests.exceptions.MissingSchema:
-            #requests 1.1
-            pass
+
+        # one session for every object type, so connections (and tls
+        # handshakes) get reused across requests
+        self.session = self._make_session(
+            not self.capabilities['ssl_kwargs'], auth)
+
         for m in ['get', 'head', 'post', 'put', 'patch', 'delete']:
-            if old:
-                f = partial(getattr(self.requests, m),
-                            auth=auth)
-            else:
-                f = partial(getattr(self.requests, m),
-                            cert=self.cert,
-                            verify=self.verify,
-                            auth=auth)
-            setattr(self, m, ensure_json(f))
+            setattr(self, m, ensure_json(partial(self._request, m)))
 
     def __getattr__(self, attr):
         return getattr(self.requests, attr)
 
+    def _make_session(self, old, auth):
+        if old:
+            return requests.session(auth=auth)
+
+        if self.capabilities['adapters']:
+            # requests >= 1.0: pool sizing lives on the transport adapter
+            session = requests.Session()
+            for prefix in ['http://', 'https://']:
+                session.mount(prefix, requests.adapters.HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size))
+            session.auth = auth
+            session.cert = self.cert
+            session.verify = self.verify
+            return session
+
+        return requests.session(auth=auth,
+                                cert=self.cert,
+                                verify=self.verify,
+                                config={'keep_alive': True,
+                                        'pool_connections': self.pool_size,
+                                        'pool_maxsize': self.pool_size})
+
+    def _request(self, method, url, stream=False, **kwargs):
+        with self._lock:
+            self.request_count += 1
+
+        if stream:
+            # requests 0.x spells stream=True as prefetch=False
+            kwarg = self.capabilities['stream_kwarg']
+            kwargs[kwarg] = (kwarg == 'stream')
+
+        # nothing below gets formatted unless debug logging is on
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return self.session.request(method.upper(), url, **kwargs)
+
+        if self.log_format != 'structured':
+            self.http_log_req(url, method, **kwargs)
+
+        start = time.time()
+        r = self.session.request(method.upper(), url, **kwargs)
+        latency = time.time() - start
+
+        if self.log_format == 'structured':
+            self.http_log_structured(method, url, r, latency, **kwargs)
+        else:
+            self.http_log_resp(r, body=not stream)
+        return r
+
+    def release(self, resp):
+        """Hand the connection of a streamed response back to the pool.
+
+        If the body was not read to the end the connection is closed
+        first, as the unread remainder would corrupt the next response.
+        """
+        raw = getattr(resp, 'raw', None)
+        if raw is None:
+            return
+
+        fp = getattr(raw, '_fp', None)
+        connection = getattr(raw, '_connection', None)
+        if fp is not None and not fp.isclosed() and connection is not None:
+            connection.close()
+        if hasattr(raw, 'release_conn'):
+            raw.release_conn()
+
+    def _pools(self):
+        if hasattr(self.session, 'adapters'):
+            managers = [a.poolmanager for a in self.session.adapters.values()
+                        if hasattr(a, 'poolmanager')]
+        else:
+            managers = [getattr(self.session, 'poolmanager', None)]
+
+        pools = []
+        for manager in managers:
+            if manager is None:
+                continue
+            for key in manager.pools.keys():
+                try:
+                    pools.append(manager.pools[key])
+                except KeyError:
+                    pass
+        return pools
+
+    def connection_stats(self):
+        """Report how well the connection pool is being used.
+
+        'connections' is the number of sockets opened, 'reused' the
+        number of requests that went out over an already open one.
+        """
+        connections = 0
+        pooled_requests = 0
+        for pool in self._pools():
+            connections += getattr(pool, 'num_connections', 0)
+            pooled_requests += getattr(pool, 'num_requests', 0)
+
+        return {'requests': self.request_count,
+                'connections': connections,
+                'reused': max(pooled_requests - connections, 0)}
+
+    def close(self):
+        self.session.close()
+
     def http_log_req(self, url, method, **kwargs):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+
         string_parts = ['curl -i ']
         string_parts.append(url)
         if 'params' in kwargs:
@@ -121,11 +337,32 @@ class Requester(object):
             if kwargs['payload'] is not None:
                 string_parts.append(" -d '%s'" % (kwargs['payload']))
 
-        self.logger.debug("Request Made:\nREQ: %s\n" % "".join(string_parts))
+        self.logger.debug("Request Made:\nREQ: %s\n", "".join(string_parts))
+
+    def http_log_resp(self, resp, body=True):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
 
-    def http_log_resp(self, resp):
+        # reading a streamed body here would defeat the streaming
         self.logger.debug("Response Received:\nRESP: [%s] %s\nRESP BODY: %s\n",
-                          resp.status_code, resp.headers, resp.text)
+                          resp.status_code, resp.headers,
+                          resp.text if body else '<streamed>')
+
+    def http_log_structured(self, method, url, resp, latency, **kwargs):
+        # streamed bodies have not been read yet, so only trust the header
+        streamed = kwargs.get('stream') or kwargs.get('prefetch') is False
+        nbytes = resp.headers.get('content-length')
+        if nbytes is None and not streamed:
+            nbytes = len(resp.content or '')
+
+        fields = {'method': method.upper(),
+                  'url': url,
+                  'status': resp.status_code,
+                  'bytes': nbytes,
+                  'latency': latency}
+        self.logger.debug('method=%(method)s url=%(url)s status=%(status)s '
+                          'bytes=%(bytes)s latency=%(latency).4fs',
+                          fields, extra=fields)
 
 
 # this might be a trifle naive
@@ -169,6 +406,7 @@ class SchemaEntry:
     def __init__(self, field_name, schema_entry):
         self.field_name = field_name
         self.schema_entry = schema_entry
+        self._type = None
 
     def is_fk(self):
         if 'fk' in self.schema_entry:
@@ -182,6 +420,11 @@ class SchemaEntry:
         return self.schema_entry['unique']
 
     def type(self):
+        if self._type is None:
+            self._type = self._field_type()
+        return self._type
+
+    def _field_type(self):
         if self.schema_entry['type'] == 'INTEGER':
             return 'number'
         elif self.schema_entry['type'] == 'TEXT':
@@ -206,19 +449,16 @@ class ObjectSchema:
         self.object_type = object_type
         self.fk = {}
         self.friendly_name = 'id'
+        self._printable_cols = None
 
         schema_uri = "%s/%s/schema" % (endpoint.endpoint,
                                        pluralize(object_type))
 
-        #self.endpoint.requests.http_log_req(schema_uri, "get",
-        #                                    headers={'content-type':
-        #                                    'application/json'})
-        r = endpoint.requests.get(schema_uri,
-                                  headers={'content-type': 'application/json'})
-        #self.endpoint.requests.http_log_resp(r)
+        schema_json = endpoint._get_schema_json(pluralize(object_type),
+                                                schema_uri)
         # if we can't get a schema, might as well
         # just let the exception happen
-        self.field_schema = r.json['schema']
+        self.field_schema = schema_json['schema']
         self.fields = {}
         for k, v in self.field_schema.items():
             self.fields[k] = SchemaEntry(k, v)
@@ -236,17 +476,19 @@ class ObjectSchema:
             self.friendly_name = 'hostname'
 
     def printable_cols(self):
-        field_list = [x for x in self.fields.keys()
-                      if self.fields[x].type() != 'json']
-        # move id to the front
-        if 'id' in field_list:
-            field_list.remove('id')
-            field_list.insert(0, 'id')
+        if self._printable_cols is None:
+            field_list = [x for x in self.fields.keys()
+                          if self.fields[x].type() != 'json']
+            # move id to the front
+            if 'id' in field_list:
+                field_list.remove('id')
+                field_list.insert(0, 'id')
+            self._printable_cols = field_list
 
-        return field_list
+        return list(self._printable_cols)
 
     def has_field(self, field_name):
-        return field_name in self.fields.keys()
+        return field_name in self.fields
 
     def has_fk_for(self, table):
         return table in self.fk
@@ -257,6 +499,167 @@ class ObjectSchema:
         return None
 
 
+# what can be set on an object besides its fields
+OBJECT_ATTRIBUTES = frozenset(['attributes',
+                               'changed_fields',
+                               'endpoint',
+                               'object_type',
+                               'synthesized_fields',
+                               'validators',
+                               'logger',
+                               'schema'])
+
+
+class RawJSON(object):
+    """Text assigned to a json field, kept as is until something
+    reads the field."""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def decode(self):
+        try:
+            return json_loads(self.text)
+        except ValueError:
+            # no json... make it a string
+            return self.text
+
+    def dumps(self):
+        # the text still has to be checked, but valid json goes out
+        # as it came in rather than being re-encoded
+        try:
+            json_loads(self.text)
+        except ValueError:
+            return json.dumps(self.text)
+        return self.text
+
+
+def _coerce_json(value):
+    if isinstance(value, str):   # SHOULD I BE DOING THIS?!?!?!
+        return RawJSON(value)
+    return value
+
+
+def _field_value(attributes, name):
+    value = attributes.get(name)
+    if value.__class__ is RawJSON:
+        # decode once, on first use
+        value = attributes[name] = value.decode()
+    return value
+
+
+def _copy_json(value):
+    # attributes only ever hold json data, which this copies in about
+    # half the time copy.deepcopy takes
+    if isinstance(value, dict):
+        return dict((k, _copy_json(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    if value.__class__ is RawJSON:
+        return value.decode()
+    return value
+
+
+def dumps_attributes(attributes, sort_keys=False):
+    """json for a dict of attributes, with any RawJSON values spliced
+    in as they are."""
+    raw = [(k, v) for k, v in attributes.iteritems()
+           if v.__class__ is RawJSON]
+    if not raw:
+        return json.dumps(attributes, sort_keys=sort_keys)
+
+    if sort_keys:
+        # each member on its own, so the raw ones sort in with the rest
+        members = []
+        for k, v in sorted(attributes.iteritems()):
+            if v.__class__ is RawJSON:
+                value = v.dumps()
+            else:
+                value = json.dumps(v, sort_keys=True)
+            members.append('%s: %s' % (json.dumps(k), value))
+        return '{%s}' % ', '.join(members)
+
+    rest = dict((k, v) for k, v in attributes.iteritems()
+                if v.__class__ is not RawJSON)
+    members = ['%s: %s' % (json.dumps(k), v.dumps()) for k, v in raw]
+    if rest:
+        members.insert(0, json.dumps(rest)[1:-1])
+    return '{%s}' % ', '.join(members)
+
+
+class Field(object):
+    """Attribute for one schema field of a generated object class."""
+    def __init__(self, name, coerce=None):
+        self.name = name
+        self.coerce = coerce
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return _field_value(obj.__dict__['attributes'], self.name)
+
+    def __set__(self, obj, value):
+        if self.coerce is not None:
+            value = self.coerce(value)
+        obj.__dict__['attributes'][self.name] = value
+        obj.__dict__['changed_fields'].add(self.name)
+
+
+class ForeignKey(object):
+    """Attribute following an fk to the object it points at."""
+    def __init__(self, table):
+        self.table = table
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return obj._cross_object(self.table)
+
+
+def _generated_setattr(self, name, value):
+    # the same as Field.__set__, inlined to save a call per write
+    if name in self._coercers:
+        coerce = self._coercers[name]
+        if coerce is not None:
+            value = coerce(value)
+        attributes = self.__dict__
+        attributes['attributes'][name] = value
+        attributes['changed_fields'].add(name)
+    elif name in OBJECT_ATTRIBUTES:
+        object.__setattr__(self, name, value)
+    else:
+        raise AttributeError("'OpenCenter%s' object has no attribute '%s'"
+                             % (self.object_type.capitalize(), name))
+
+
+def object_class(base, schema):
+    """Compile schema into a subclass of base.
+
+    Fields and fk accessors become class attributes, so reading one is
+    a single lookup instead of a trip through __getattr__, and the type
+    of each field is worked out once rather than on every write.
+    """
+    namespace = {'_generic': base is OpenCenterObject,
+                 '__setattr__': _generated_setattr}
+    coercers = {}
+
+    for name, entry in schema.fields.items():
+        coerce = None
+        if entry.type() in ['json', 'json_entry']:
+            coerce = _coerce_json
+        namespace[name] = Field(name, coerce)
+        coercers[name] = coerce
+
+    for table in schema.fk:
+        name = singularize(table)
+        if not name in namespace and not hasattr(base, name):
+            namespace[name] = ForeignKey(table)
+
+    namespace['_coercers'] = coercers
+    return type(base.__name__, (base,), namespace)
+
+
 class RequestResult(object):
     def __init__(self, endpoint, response):
         self.response = response
@@ -267,11 +670,18 @@ class RequestResult(object):
             self.execution_plan = ExecutionPlan(self.response.json['plan'])
 
     def __nonzero__(self):
+        # a 304 answers a conditional get: what we have is current
+        if self.not_modified:
+            return True
         if self.response.status_code < 200 or \
                 self.response.status_code > 299:
             return False
         return True
 
+    @property
+    def not_modified(self):
+        return self.response.status_code == 304
+
     @property
     def requires_input(self):
         if self.response.status_code == 409:
@@ -307,6 +717,35 @@ class RequestResult(object):
         return self.response.json
 
 
+class BulkResult(object):
+    """How one write of a bulk operation went: the object written, and
+    either the RequestResult (which has the execution plan of a 409) or
+    the exception the write raised."""
+    def __init__(self, obj, result=None, error=None):
+        self.obj = obj
+        self.result = result
+        self.error = error
+
+    def __nonzero__(self):
+        return self.error is None and bool(self.result)
+
+    @property
+    def status_code(self):
+        if self.result is None:
+            return None
+        return self.result.status_code
+
+    @property
+    def requires_input(self):
+        return self.result is not None and self.result.requires_input
+
+    @property
+    def execution_plan(self):
+        if self.result is None:
+            return None
+        return self.result.execution_plan
+
+
 class ExecutionPlan(object):
     def __init__(self, plan):
         self.raw_plan = plan
@@ -383,24 +822,71 @@ class ExecutionPlan(object):
         return self.raw_plan
 
 
+STREAM_CHUNK_SIZE = 16384
+
+# ids per page for paged iteration
+DEFAULT_PAGE_SIZE = 500
+# enough to see whether a response has a first item
+PROBE_CHUNK_SIZE = 1024
+
+# how many ids to look up with an id filter before fetching the table
+PREFETCH_FILTER_IDS = 100
+
+_filter_token = re.compile(
+    r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|([A-Za-z_][A-Za-z0-9_]*)')
+_filter_keywords = ['and', 'or', 'not', 'in', 'true', 'false', 'none', 'null']
+
+
+def filter_fields(filter_string):
+    """Names a filter string refers to.
+
+    This over-approximates (function names and json sub-keys count too),
+    which only ever makes invalidation more conservative.
+    """
+    fields = set()
+    for match in _filter_token.finditer(filter_string or ''):
+        name = match.group(1)
+        if name and name.lower() not in _filter_keywords:
+            fields.add(name)
+    return fields
+
+
 class LazyDict:
-    def __init__(self, object_type, endpoint, filter_string=None):
+    def __init__(self, object_type, endpoint, filter_string=None,
+                 streaming=False, columnar=False, page_size=None):
         self.endpoint = endpoint
         self.object_type = object_type
         self.dict = {}
         self.refreshed = False
+        self.refreshed_at = None
         self.filter_string = filter_string
+        self.filter_fields = filter_fields(filter_string)
         self.schema = None
         self.dirty = False
+        # ids whose cached objects may be out of date
+        self.stale = set()
+        self.streaming = streaming
+        # keep refreshed rows in a ColumnStore rather than as objects
+        self.columnar = columnar
+        # iterate a page of ids at a time rather than fetching everything
+        self.page_size = page_size
+        # etag/last-modified/body digest of the last full refresh
+        self.validators = {}
         self.logger = logging.getLogger('opencenter.endpoint')
 
     def __len__(self):
         return len(self.dict)
 
     def __iter__(self):
+        # paged and streaming tables hand out objects as they are read,
+        # rather than loading the whole collection first
+        if self._should_page():
+            return self.iter_paged(self.page_size)
+        if self._should_stream():
+            return self.stream()
+
         self._refresh()
-        for k, v in self.dict.iteritems():
-            yield v
+        return self.dict.itervalues()
 
     def iteritems(self):
         self._refresh()
@@ -410,22 +896,8 @@ class LazyDict:
         return self.new(**kwargs)
 
     def new(self, **kwargs):
-        obj = None
-
         self._maybe_refresh_schema()
-
-        type_class = "OpenCenter%s" % self.object_type.capitalize()
-        if type_class in globals():
-            obj = globals()[type_class](endpoint=self.endpoint, **kwargs)
-        else:
-            # we'll just assume it's a default type.
-            # we won't be able to do anything other
-            # than crud options, but that's better
-            # than nothing.
-            obj = OpenCenterObject(object_type=self.object_type,
-                                   endpoint=self.endpoint,
-                                   **kwargs)
-        return obj
+        return self.endpoint._new_object(self.object_type, **kwargs)
 
     def items(self):
         self._refresh()
@@ -435,67 +907,93 @@ class LazyDict:
         return result
 
     def __str__(self):
-        self._refresh()
-        max_width = 30
-        if len(self.dict.keys()) == 0:
-            return ''
-        else:
-            self._maybe_refresh_schema()
-            field_list = self.schema.printable_cols()
-            field_lens = {}
-
-            for field in field_list:
-                field_lens[field] = max([len(str(x._resolved_value(field))) + 1
-                                         for x in self.dict.values()] +
-                                        [len(field.replace('_id', '')) + 1])
-                field_lens[field] = min([field_lens[field], max_width])
-
-            # field_lens = dict([(k, len(k) + 1) for k in field_list])
-            output_str = ''
-            for k in field_list:
-                output_str += ("%%-%ds|" % (field_lens[k],)) % (
-                    k.replace('_id', ''),)
-            output_str += '\n'
-
-            for k in field_list:
-                output_str += ('-' * field_lens[k]) + '|'
-            output_str += '\n'
-
-            for k, v in self.dict.iteritems():
-                output_str += v.col_format(separator='|',
-                                           widths=field_lens) + '\n'
-
-            return output_str
+        out = StringIO.StringIO()
+        self.render(out)
+        return out.getvalue()
+
+    def render(self, out, widths=None, sample=None):
+        """Write this table to out as str() formats it, a row at a time.
+
+        Column widths can be given as a dict, or taken from the first
+        sample rows; either way rows are written as they are read.
+        """
+        TableRenderer(self, out, widths=widths, sample=sample).render()
+
+    def _fk_names(self, rows, fields):
+        """Friendly names of everything rows point at through the fk
+        fields, keyed by (table, id).
+
+        Referenced objects are fetched a table at a time rather than an
+        id at a time.
+        """
+        wanted = {}
+        for field in fields:
+            if not self.schema.fields[field].is_fk():
+                continue
+            table = self.schema.fields[field].fk()[0]
+            ids = wanted.setdefault(table, set())
+            for row in rows:
+                v = getattr(row, field)
+                if v:
+                    ids.add(int(v))
+
+        names = {}
+        for table, ids in wanted.items():
+            if not table in self.endpoint.get_objectlist():
+                continue
+            found = self.endpoint._prefetch(table, ids)
+            for key in ids:
+                obj = found.get(key)
+                if obj is None:
+                    names[(table, key)] = '%s [orphaned]' % key
+                else:
+                    names[(table, key)] = getattr(obj,
+                                                  obj.schema.friendly_name)
+        return names
 
     def __getitem__(self, key):
         if not key in self.dict:
-            type_class = "OpenCenter%s" % self.object_type.capitalize()
-            if type_class in globals():
-                value = globals()[type_class](endpoint=self.endpoint)
-            else:
-                # make a generic
-                value = OpenCenterObject(object_type=self.object_type,
-                                         endpoint=self.endpoint)
-            value.id = key
-            if value._request_get():
-                self.dict[key] = value
-            else:
-                raise KeyError("OpenCenter%s id '%s' not found" %
-                               (self.object_type.capitalize(), key))
+            # the object may already be loaded through some other table,
+            # filter or fk
+            table = self.endpoint[pluralize(self.object_type)]
+            revalidate = self.dirty or key in table.stale
+            value = self.endpoint._fetch(self.object_type, key, revalidate)
+            table.stale.discard(key)
+            self.dict[key] = value
             return value
         else:
             # if the table is dirty, refresh the entry
-            if self.dirty:
+            if self.dirty or key in self.stale:
                 self.dict[key]._request_get()
+                self.stale.discard(key)
             return self.dict[key]
 
     def __setitem__(self, key, value):
         self.dict[key] = value
 
     def filter(self, filter_string):
-        return LazyDict(self.object_type, self.endpoint, filter_string)
+        cache = self.endpoint.filter_cache
+        if cache is not None:
+            view = cache.get(self.object_type, filter_string)
+            if view is not None:
+                return view
+
+        view = LazyDict(self.object_type, self.endpoint, filter_string,
+                        streaming=self.streaming, columnar=self.columnar,
+                        page_size=self.page_size)
+        self.endpoint._add_view(view)
+        if cache is not None:
+            cache.put(self.object_type, filter_string, view)
+        return view
 
     def first(self):
+        if self._should_page() or self._should_stream():
+            rows = iter(self)
+            try:
+                return next(rows, None)
+            finally:
+                rows.close()
+
         self._refresh()
         if len(self.dict) == 0:
             return None
@@ -506,49 +1004,272 @@ class LazyDict:
         if not self.schema:
             self.schema = self.endpoint.get_schema(self.object_type)
 
+    def _should_stream(self):
+        return self.streaming and (self.dirty or not self.refreshed)
+
+    def _should_page(self):
+        return self.page_size and (self.dirty or not self.refreshed)
+
+    def _collection_request(self, headers=None, filter_string=None,
+                            **kwargs):
+        base_endpoint = urlparse.urljoin(self.endpoint.endpoint,
+                                         pluralize(self.object_type)) + '/'
+        request_headers = {'content-type': 'application/json'}
+        request_headers.update(headers or {})
+
+        # the requester logs requests and responses itself, and
+        # only when debug logging is on
+        if filter_string is None:
+            filter_string = self.filter_string
+        if filter_string:
+            return self.endpoint.requests.post(
+                urlparse.urljoin(base_endpoint, 'filter'),
+                headers=request_headers,
+                data=json.dumps({'filter': filter_string}),
+                **kwargs)
+
+        return self.endpoint.requests.get(
+            base_endpoint,
+            headers=request_headers,
+            **kwargs)
+
+    def _build(self, item):
+        return self.endpoint._canonical(self.object_type, item)
+
+    def stream(self, chunk_size=STREAM_CHUNK_SIZE):
+        """Yield the objects in this collection as they are parsed from
+        the response.
+
+        Nothing is kept in the table, so memory use stays flat however
+        large the collection is.
+        """
+        self._maybe_refresh_schema()
+
+        r = self._collection_request(stream=True)
+        try:
+            r.raise_for_status()
+            for text in jsonstream.iter_array(r.iter_content(chunk_size),
+                                              pluralize(self.object_type)):
+                yield self._build(json_loads(text))
+        finally:
+            self.endpoint.requests.release(r)
+
+    def _id_range(self, low, high=None):
+        """This collection's filter, narrowed to ids from low up to (not
+        including) high."""
+        ids = 'id >= %d' % low
+        if high is not None:
+            ids += ' and id < %d' % high
+        if self.filter_string:
+            return '(%s) and %s' % (self.filter_string, ids)
+        return ids
+
+    def _id_from(self, low):
+        """The id of the first object the api lists with an id of low or
+        more, or None if there are none.
+
+        Only as much of the response as holds the first item is read.
+        """
+        r = self._collection_request(filter_string=self._id_range(low),
+                                     stream=True)
+        try:
+            r.raise_for_status()
+            items = jsonstream.iter_array(r.iter_content(PROBE_CHUNK_SIZE),
+                                          pluralize(self.object_type))
+            text = next(items, None)
+            if text is None:
+                return None
+            return int(json_loads(text)['id'])
+        finally:
+            self.endpoint.requests.release(r)
+
+    def iter_pages(self, page_size=DEFAULT_PAGE_SIZE):
+        """Yield this collection as lists of objects, in id order.
+
+        The api has no paging of its own, so each page is a filter for
+        the next page_size ids, and holds at most page_size objects.  A
+        gap in the ids costs one extra request to find where it ends.
+        Pages are only fetched as they are asked for, and nothing is kept
+        in the table: a scan holds one page at a time and can stop early.
+        """
+        self._maybe_refresh_schema()
+        plural = pluralize(self.object_type)
+        low, high = 0, page_size
+        while True:
+            r = self._collection_request(
+                filter_string=self._id_range(low, high))
+            r.raise_for_status()
+            items = r.json[plural]
+            items.sort(key=lambda x: x['id'])
+            # a window stretched over a gap can hold more than a page
+            # if the api doesn't list in id order
+            for start in range(0, len(items), page_size):
+                yield [self._build(x) for x in items[start:start + page_size]]
+
+            if items:
+                low, high = high, high + page_size
+                continue
+
+            # step over a gap in the ids in one request.  the window
+            # still starts where this one ended, so nothing is skipped
+            # whatever order the api lists in
+            next_id = self._id_from(high)
+            if next_id is None:
+                return
+            low, high = high, next_id + page_size
+
+    def iter_paged(self, page_size=DEFAULT_PAGE_SIZE):
+        """Yield the objects of iter_pages one at a time."""
+        for page in self.iter_pages(page_size):
+            for obj in page:
+                yield obj
+
     def _refresh(self, force=False):
         self._maybe_refresh_schema()
 
         # if this table is marked as dirty, then it must refresh
         # itself.
         if (not self.refreshed) or (self.dirty) or force:
-            self.dict = {}
-            base_endpoint = urlparse.urljoin(self.endpoint.endpoint,
-                                             pluralize(self.object_type)) + '/'
-
-            if self.filter_string:
-                self.endpoint.requests.http_log_req(
-                    urlparse.urljoin(base_endpoint, 'filter'), "post",
-                    headers={'content-type': 'application/json'},
-                    data=json.dumps({'filter': self.filter_string}))
-                r = self.endpoint.requests.post(
-                    urlparse.urljoin(base_endpoint, 'filter'),
-                    headers={'content-type': 'application/json'},
-                    data=json.dumps({'filter': self.filter_string}))
-                self.endpoint.requests.http_log_resp(r)
-                self.logger.debug('payload: %s' % (
-                    {'filter': self.filter_string}))
-            else:
-                self.endpoint.requests.http_log_req(
-                    base_endpoint, "get",
-                    headers={'content-type': 'application/json'})
-                r = self.endpoint.requests.get(
-                    base_endpoint,
-                    headers={'content-type': 'application/json'})
-                self.endpoint.requests.http_log_resp(r)
-
-            for item in r.json[pluralize(self.object_type)]:
-                type_class = "OpenCenter%s" % self.object_type.capitalize()
-                if type_class in globals():
-                    obj = globals()[type_class](endpoint=self.endpoint)
-                else:
-                    # fall back to generic
-                    obj = OpenCenterObject(endpoint=self.endpoint,
-                                           object_type=self.object_type)
-                obj.attributes = item
-                self.dict[obj.id] = obj
+            headers = {}
+            if self.refreshed:
+                headers = conditional_headers(self.validators)
+            r = self._collection_request(headers=headers)
+
+            # on a 304, or a body identical to last time, the objects we
+            # already built are still right.  there is no last time on
+            # the first load, so no digest either
+            if r.status_code != 304:
+                digest = None
+                if self.refreshed:
+                    digest = hashlib.md5(r.content).hexdigest()
+                if digest is None or digest != self.validators.get('digest'):
+                    self.dict = {}
+                    build = self._build
+                    if self.columnar:
+                        from columnar import ColumnStore
+                        build = ColumnStore(self.endpoint, self.object_type,
+                                            self.schema).append
+                    for item in r.json[pluralize(self.object_type)]:
+                        obj = build(item)
+                        self.dict[obj.id] = obj
+                self.validators = response_validators(r)
+                if digest is not None:
+                    self.validators['digest'] = digest
             self.refreshed = True
+            self.refreshed_at = time.time()
             self.dirty = False
+            self.stale = set()
+
+        elif self.stale:
+            for key in [x for x in self.stale if x in self.dict]:
+                self.dict[key]._request_get()
+                self.stale.discard(key)
+
+    def _store(self, obj):
+        """Take the object a write returned as the current copy."""
+        self.dict[obj.id] = obj
+        self.stale.discard(obj.id)
+
+    def _evict(self, key):
+        self.dict.pop(key, None)
+        self.stale.discard(key)
+
+    def _mark_stale(self, key):
+        # ids not in the table are kept too: a lookup by id may find
+        # the object in the identity map, and has to revalidate it
+        self.stale.add(key)
+
+    def _bulk_object(self, item):
+        from columnar import Row
+
+        if isinstance(item, OpenCenterObject):
+            return item
+        if isinstance(item, Row):
+            return item.object()
+        # ids read from argv or files come as strings
+        if isinstance(item, basestring) and item.strip().isdigit():
+            item = int(item)
+        if isinstance(item, (int, long)):
+            obj = self.endpoint._identity.get((self.object_type, item))
+            if obj is None:
+                obj = self.new(id=item)
+            return obj
+        raise TypeError('expected an OpenCenter%s, a row or an id, not %r' %
+                        (self.object_type.capitalize(), item))
+
+    def _bulk(self, how, objects, workers=None):
+        objects = list(objects)
+        if workers is None:
+            workers = self.endpoint._worker_count()
+        pool = WorkerPool(max(min(workers, len(objects)), 1))
+        try:
+            futures = [pool.submit(x._bulk_request, how) for x in objects]
+            results = []
+            for obj, future in zip(objects, futures):
+                error = future.exception()
+                if error is None:
+                    results.append(BulkResult(obj, future.result()))
+                else:
+                    results.append(BulkResult(obj, error=error))
+        finally:
+            pool.shutdown(wait=False)
+
+        # the tables and views are brought up to date once, here, rather
+        # than by each write from its own thread
+        done = [x.obj for x in results if x]
+        for obj in done:
+            obj.changed_fields = set()
+        self.endpoint._invalidate_many(self.object_type, how, done)
+        return results
+
+    def bulk_create(self, items, workers=None):
+        """Create objects from dicts of attributes (or unsaved objects),
+        several at a time.
+
+        Returns a BulkResult for each, in order.  Execution plans are
+        returned rather than solved.
+        """
+        objects = [x if isinstance(x, OpenCenterObject) else self.new(**x)
+                   for x in items]
+        return self._bulk('post', objects, workers)
+
+    def bulk_update(self, updates, workers=None):
+        """Save changed objects, or apply a dict of {id: {field: value}},
+        several at a time, returning a BulkResult for each.
+
+        Objects given by id are not fetched first.
+        """
+        if isinstance(updates, dict):
+            objects = []
+            for key, changes in sorted(updates.items()):
+                obj = self._bulk_object(key)
+                for field, value in changes.items():
+                    setattr(obj, field, value)
+                objects.append(obj)
+        else:
+            objects = [self._bulk_object(x) for x in updates]
+        return self._bulk('put', objects, workers)
+
+    def bulk_delete(self, items, workers=None):
+        """Delete objects, or ids, several at a time, returning a
+        BulkResult for each."""
+        return self._bulk('delete', [self._bulk_object(x) for x in items],
+                          workers)
+
+    def _invalidate_for(self, obj, how):
+        """Bring a filter view up to date after a write to obj."""
+        if how == 'delete':
+            self._evict(obj.id)
+            return
+
+        # a put that left every field the filter looks at alone can't
+        # change which objects match, so only the entry needs replacing
+        if how == 'put' and not (obj.changed_fields & self.filter_fields):
+            if obj.id in self.dict:
+                self._store(obj)
+            return
+
+        self.dirty = True
 
     def cached_keys(self):
         return self.dict.keys()
@@ -572,7 +1293,14 @@ class OpenCenterEndpoint:
     def __init__(self, endpoint=None, cert=None, opencenter_ca=None,
                  user=None,
                  password=None,
-                 interactive=False):
+                 interactive=False,
+                 pool_size=None,
+                 transport=None,
+                 schema_cache=False,
+                 streaming=False,
+                 filter_cache=False,
+                 columnar=False,
+                 page_size=None):
         self.endpoint = endpoint
         self.interactive = interactive
         if endpoint is None:
@@ -583,15 +1311,40 @@ class OpenCenterEndpoint:
             # some versions of requests don't like user:pass in uris
             self.endpoint = endpoint
 
-        self.requests = Requester(cert, opencenter_ca, user, password)
+        self.requests = transport
+        if transport is None:
+            self.requests = Requester(cert, opencenter_ca, user, password,
+                                      pool_size=pool_size)
 
         self.logger = logging.getLogger('opencenter.endpoint')
         self.schemas = {}
+        # schemas and classes are made once per type, however many
+        # threads ask
+        self._type_locks = {}
+        self._type_locks_lock = threading.Lock()
+        # filter views handed out, by plural type
+        self._views = {}
+        # the one live object for each (type, id), however it was reached
+        self._identity = weakref.WeakValueDictionary()
+        # object classes generated from the schemas, by type
+        self._classes = {}
+
+        # schema_cache may be True (cache in the default location), a
+        # cache directory, or a SchemaCache
+        if schema_cache is True:
+            schema_cache = SchemaCache(self.endpoint)
+        elif isinstance(schema_cache, basestring):
+            schema_cache = SchemaCache(self.endpoint, cache_dir=schema_cache)
+        self.schema_cache = schema_cache or None
+
+        # filter_cache may be True, or a FilterCache
+        if filter_cache is True:
+            filter_cache = FilterCache()
+        self.filter_cache = filter_cache or None
 
         try:
-            #self.requests.http_log_req('%s/schema' % self.endpoint, 'get')
-            r = self.requests.get('%s/schema' % self.endpoint, timeout=15)
-            #self.requests.http_log_resp(r)
+            schema_json = self._get_schema_json(
+                'schema', '%s/schema' % self.endpoint, timeout=15)
 
         except requests.exceptions.ConnectionError as e:
             self.logger.error(str(e))
@@ -600,15 +1353,13 @@ class OpenCenterEndpoint:
             raise requests.exceptions.ConnectionError(
                 'could not connect to endpoint %s/schema' % self.endpoint)
 
-        if r.status_code == 401:
-            r.raise_for_status()
-
         try:
-            self.master_schema = r.json['schema']
+            self.master_schema = schema_json['schema']
             self._object_lists = {}
-            for obj_type in r.json['schema']['objects']:
+            for obj_type in schema_json['schema']['objects']:
                 self._object_lists[obj_type] = LazyDict(
-                    singularize(obj_type), self)
+                    singularize(obj_type), self, streaming=streaming,
+                    columnar=columnar, page_size=page_size)
         except:
             raise AttributeError('Invalid endpoint - no /schema')
 
@@ -623,23 +1374,201 @@ class OpenCenterEndpoint:
             raise AttributeError("'OpenCenterEndpoint' has no attribute '%s'" %
                                  name)
         else:
-            if not self._object_lists[name]:
+            # an empty table that was never listed will fetch itself
+            # anyway; marking it dirty would only make every later
+            # lookup by id refetch
+            table = self._object_lists[name]
+            if not table and table.refreshed:
                 self._refresh(name, 'list')
-            return self._object_lists[name]
+            return table
 
     def _refresh(self, what, why):
-        self.logger.debug('Refreshing %s for %s' % (what, why))
+        self.logger.debug('Refreshing %s for %s', what, why)
         self._object_lists[what].dirty = True
 
-    def _invalidate(self, what, how):
-        self.logger.debug('invalidating %s on %s' % (what, how))
+    def _object_class(self, object_type):
+        cls = self._classes.get(object_type)
+        if cls is None:
+            # one class per type, or objects of it wouldn't share a type
+            with self._type_lock(object_type):
+                cls = self._classes.get(object_type)
+                if cls is None:
+                    type_class = "OpenCenter%s" % object_type.capitalize()
+                    base = globals().get(type_class, OpenCenterObject)
+                    cls = object_class(base, self.get_schema(object_type))
+                    self._classes[object_type] = cls
+        return cls
+
+    def _new_object(self, object_type, **kwargs):
+        cls = self._object_class(object_type)
+        if cls._generic:
+            # we'll just assume it's a default type.  we won't be able
+            # to do anything other than crud options, but that's
+            # better than nothing.
+            return cls(object_type=object_type, endpoint=self, **kwargs)
+        return cls(endpoint=self, **kwargs)
+
+    def _canonical(self, object_type, attributes):
+        """The live object for attributes['id'], updated to attributes.
+
+        Fields set on the object and not yet saved keep their local
+        values.
+        """
+        key = (object_type, attributes['id'])
+        obj = self._identity.get(key)
+        if obj is None:
+            obj = self._new_object(object_type)
+            self._identity[key] = obj
+        if obj.changed_fields:
+            attributes = dict(attributes)
+            for name in obj.changed_fields:
+                if name in obj.attributes:
+                    attributes[name] = obj.attributes[name]
+        obj.attributes = attributes
+        return obj
+
+    def _fetch(self, object_type, key, revalidate=False):
+        """The live object for an id, fetched if we don't have it yet."""
+        obj = self._identity.get((object_type, key))
+        if obj is not None and not revalidate:
+            return obj
+
+        if obj is None:
+            obj = self._new_object(object_type)
+            obj.id = key
+        if not obj._request_get():
+            raise KeyError("OpenCenter%s id '%s' not found" %
+                           (object_type.capitalize(), key))
+        self._identity[(object_type, key)] = obj
+        return obj
+
+    def _prefetch(self, table, ids):
+        """Make sure the objects for ids are loaded, in one request.
+
+        Returns a dict of the ones that exist, by id.
+        """
+        lazy = self._object_lists[table]
+        object_type = singularize(table)
+        found = {}
+        missing = set()
+        for key in ids:
+            obj = None
+            if not lazy.dirty:
+                obj = lazy.dict.get(key)
+            if obj is None:
+                obj = self._identity.get((object_type, key))
+            if obj is not None and not key in lazy.stale:
+                found[key] = obj
+            else:
+                missing.add(key)
+
+        if missing:
+            if len(missing) > PREFETCH_FILTER_IDS:
+                # past a point, the whole table is the cheaper request
+                rows = lazy.values()
+            else:
+                rows = LazyDict(object_type, self, ' or '.join(
+                    ['(id=%d)' % x for x in sorted(missing)])).values()
+
+            for obj in rows:
+                if obj.id in missing:
+                    # the table keeps them alive for the identity map
+                    lazy._store(obj)
+                    found[obj.id] = obj
+        return found
+
+    def _worker_count(self):
+        # no point running more requests than we have connections for
+        return getattr(self.requests, 'pool_size', None) or DEFAULT_WORKERS
+
+    def _add_view(self, view):
+        plural = pluralize(view.object_type)
+        self._views.setdefault(plural, weakref.WeakSet()).add(view)
+
+    def _invalidate(self, what, how, obj=None):
+        self.logger.debug('invalidating %s on %s', what, how)
+        if how == 'get':
+            return
+        if obj is None or obj.id is None:
+            # a write somewhere other than the object itself (a solved
+            # plan, say): we can't tell what it changed
+            plural = pluralize(what)
+            self._refresh(plural, how)
+            for view in self._views.get(plural, []):
+                view.dirty = True
+            return
+        self._invalidate_many(what, how, [obj])
+
+    def _invalidate_many(self, what, how, objs):
+        """Bring the tables and views up to date after writes to objs."""
+        plural = pluralize(what)
+        views = list(self._views.get(plural, []))
+        stale = {}
+        for obj in objs:
+            if how == 'delete':
+                self._identity.pop((what, obj.id), None)
+                self._object_lists[plural]._evict(obj.id)
+            else:
+                self._identity[(what, obj.id)] = obj
+                self._object_lists[plural]._store(obj)
+            for view in views:
+                view._invalidate_for(obj, how)
+
+            # whatever this object points at by fk may carry data derived
+            # from it (a node's facts, say), so revalidate just those
+            for table, (local_field, remote_field) in obj.schema.fk.items():
+                value = obj.attributes.get(local_field)
+                if value is None or not table in self._object_lists:
+                    continue
+                stale.setdefault(table, set()).add(int(value))
+
+        for table, keys in stale.items():
+            for lazy in [self._object_lists[table]] + \
+                    list(self._views.get(table, [])):
+                for key in keys:
+                    lazy._mark_stale(key)
+
+    def _get_schema_json(self, name, url, **kwargs):
+        cache = self.schema_cache
+        entry = cache.get(name) if cache else None
+        if entry is not None and cache.is_fresh(entry):
+            return entry['body']
+
+        headers = {'content-type': 'application/json'}
+        if entry is not None:
+            headers.update(cache.validators(entry))
+
+        r = self.requests.get(url, headers=headers, **kwargs)
+
+        if r.status_code == 401:
+            r.raise_for_status()
+
+        if entry is not None and r.status_code == 304:
+            cache.touch(name)
+            return entry['body']
+
+        if cache and r.status_code == 200 and r.json is not None:
+            cache.store(name, r.json, r.headers)
+        return r.json
 
     def get_objectlist(self):
         return self._object_lists.keys()
 
+    def watch_tasks(self, tasks, **kwargs):
+        """A TaskWatcher over tasks (ids or objects): iterate it for
+        the tasks as they complete, or call wait() for them all."""
+        return TaskWatcher(self, tasks, **kwargs)
+
+    def _type_lock(self, object_type):
+        with self._type_locks_lock:
+            return self._type_locks.setdefault(object_type, threading.RLock())
+
     def get_schema(self, object_type):
         if not object_type in self.schemas:
-            self.schemas[object_type] = ObjectSchema(self, object_type)
+            with self._type_lock(object_type):
+                if not object_type in self.schemas:
+                    self.schemas[object_type] = ObjectSchema(self,
+                                                             object_type)
         return self.schemas[object_type]
 
 
@@ -659,6 +1588,9 @@ class OpenCenterObject(object):
         self.endpoint = endpoint
         self.attributes = {}
         self.synthesized_fields = {}
+        self.validators = {}
+        # fields set locally since the object was last read or written
+        self.changed_fields = set()
 
         for k, v in kwargs.items():
             setattr(self, k, v)
@@ -669,7 +1601,7 @@ class OpenCenterObject(object):
         if self.schema.has_field(name):
             if not name in self.__dict__['attributes']:
                 return None   # valid, but not set
-            return self.__dict__['attributes'][name]
+            return _field_value(self.__dict__['attributes'], name)
 
         # try looking up along fk
         if self.schema.has_fk_for(pluralize(name)):
@@ -692,21 +1624,12 @@ class OpenCenterObject(object):
             field_type = self.schema.fields[name].type()
 
             if field_type == 'json' or field_type == 'json_entry':
-                if isinstance(value, str):   # SHOULD I BE DOING THIS?!?!?!
-                    try:
-                        value = json.loads(value)
-                    except ValueError:
-                        # no json... make it a string
-                        pass
+                value = _coerce_json(value)
 
             self.__dict__['attributes'][name] = value
+            self.__dict__['changed_fields'].add(name)
 
-        elif name in ['attributes',
-                      'endpoint',
-                      'object_type',
-                      'synthesized_fields',
-                      'logger',
-                      'schema']:
+        elif name in OBJECT_ATTRIBUTES:
             object.__setattr__(self, name, value)
         else:
             raise AttributeError("'OpenCenter%s' object has no attribute '%s'"
@@ -729,7 +1652,7 @@ class OpenCenterObject(object):
         return None
 
     def to_hash(self):
-        return copy.deepcopy(self.__dict__['attributes'])
+        return _copy_json(self.__dict__['attributes'])
 
     def to_dict(self):
         return self.to_hash()
@@ -747,13 +1670,13 @@ class OpenCenterObject(object):
             out_str = ''.join(str_bits)
         return out_str
 
-    def col_format(self, widths=None, separator=' '):
+    def col_format(self, widths=None, separator=' ', fk_names=None):
         out_str = ''
         printable_cols = self.schema.printable_cols()
 
         if self.attributes:
             for k in printable_cols:
-                v = self._resolved_value(k)
+                v = self._resolved_value(k, fk_names)
 
                 format_str = "%s"
                 value = str(v).strip()
@@ -767,7 +1690,7 @@ class OpenCenterObject(object):
                 out_str += (format_str + '%c') % (value, separator)
         return out_str
 
-    def _resolved_value(self, key):
+    def _resolved_value(self, key, fk_names=None):
         if self.schema.fields[key].is_fk():
             ctable, cfield = self.schema.fields[key].fk()
 
@@ -775,6 +1698,10 @@ class OpenCenterObject(object):
             if not v:
                 return None
 
+            # names already looked up for a whole table render
+            if fk_names is not None and (ctable, int(v)) in fk_names:
+                return fk_names[(ctable, int(v))]
+
             cross_object = self._cross_object(ctable)
 
             if not cross_object:
@@ -782,10 +1709,7 @@ class OpenCenterObject(object):
 
             return getattr(cross_object, cross_object.schema.friendly_name)
 
-        if key in self.attributes:
-            return self.attributes[key]
-        else:
-            return None
+        return _field_value(self.attributes, key)
 
     def __str__(self):
         return self.row_format()
@@ -806,9 +1730,8 @@ class OpenCenterObject(object):
         else:
             action = 'put'
 
-        ret = getattr(self, '_request_%s' % action)()
-        self.endpoint._refresh(pluralize(self.object_type), action)
-        return ret
+        # the request updates the cached tables itself
+        return getattr(self, '_request_%s' % action)()
 
     def delete(self):
         # -XDELETE, raises if no id
@@ -857,11 +1780,16 @@ class OpenCenterObject(object):
                         'post', url=self.endpoint.endpoint + '/plan/',
                         payload=payload)
 
-            self.logger.warn('status code %s on %s' %
-                             (r.status_code, request_type))
+            self.logger.warn('status code %s on %s',
+                             r.status_code, request_type)
+        elif url is None:
+            # a request on the object itself: the tables can take the
+            # result as it is instead of refetching
+            self.endpoint._invalidate(self.object_type, request_type,
+                                      obj=self)
+            self.changed_fields = set()
         else:
-            self.endpoint._invalidate(self.object_type,
-                                      request_type)
+            self.endpoint._invalidate(self.object_type, request_type)
         return r
 
     def _raw_request(self,
@@ -870,21 +1798,21 @@ class OpenCenterObject(object):
                      poll=False,
                      headers={'content-type': 'application/json'},
                      url=None,
-                     params=None):
+                     params=None,
+                     timeout=None):
         if not url:
             url = "%s%s" % (self._url_for(),
                             '?poll' if poll else '')
 
         fn = getattr(self.endpoint.requests, request_type)
         if payload:
-            payload = json.dumps(payload)
-            self.logger.debug('Payload: %s' % (payload))
+            payload = dumps_attributes(payload)
 
-        self.endpoint.requests.http_log_req(url, request_type, data=payload,
-                                            headers=headers, params=params)
-        r = fn(url, data=payload, headers=headers, params=params)
-        self.endpoint.requests.http_log_resp(r)
-        return r
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        return fn(url, data=payload, headers=headers, params=params,
+                  **kwargs)
 
     def _request_put(self):
         return self._request('put', payload=self.attributes)
@@ -892,12 +1820,47 @@ class OpenCenterObject(object):
     def _request_post(self):
         return self._request('post', payload=self.attributes)
 
+    def _attributes_digest(self):
+        return hashlib.md5(dumps_attributes(self.attributes,
+                                            sort_keys=True)).hexdigest()
+
     def _request_get(self):
-        return self._request('get')
+        headers = {'content-type': 'application/json'}
+
+        # only ask for a 304 if our attributes are still the ones that
+        # came with the validators: not set since, nor edited in place.
+        # the digest is only worth taking if a 304 is possible at all
+        conditional = conditional_headers(self.validators)
+        if conditional and not self.changed_fields and \
+                self.validators.get('digest') == self._attributes_digest():
+            headers.update(conditional)
+
+        r = self._request('get', headers=headers)
+        if r.status_code == 200:
+            self.validators = response_validators(r.response)
+            if self.validators:
+                self.validators['digest'] = self._attributes_digest()
+        return r
 
     def _request_delete(self):
         return self._request('delete')
 
+    def _bulk_request(self, request_type):
+        """One write of a bulk operation, on a worker thread.
+
+        Only this object is touched; the caller updates the tables once
+        all the writes are done.  Execution plans are left unsolved.
+        """
+        payload = None
+        if request_type != 'delete':
+            payload = self.attributes
+        r = RequestResult(self.endpoint,
+                          self._raw_request(request_type, payload=payload))
+        if r and request_type != 'delete' and r.json and \
+                self.object_type in r.json:
+            self.attributes = r.json[self.object_type]
+        return r
+
 
 class OpenCenterTask(OpenCenterObject):
     def __init__(self, **kwargs):
@@ -908,7 +1871,7 @@ class OpenCenterTask(OpenCenterObject):
                                    'logtail': lambda: self._logtail(**kwargs)}
 
     def _complete(self):
-        return self.state in ['done', 'timeout', 'cancelled']
+        return self.state in COMPLETE_STATES
 
     def _running(self):
         return self.state in ['running', 'delivered']
@@ -917,20 +1880,74 @@ class OpenCenterTask(OpenCenterObject):
         return self._complete() and self.state == 'done' and \
             'result_code' in self.result and self.result['result_code'] == 0
 
-    def wait_for_complete(self):
-        self._request_get()
+    def wait_for_complete(self, timeout=None, on_change=None, **kwargs):
+        """Poll until this task completes, backing off between polls.
 
-        while self.state not in ['done', 'timeout', 'cancelled']:
-            self._request('get', poll=True)
+        Raises RuntimeError if timeout seconds pass first.  Returns the
+        TaskWaiter, which has how many requests the wait made.
+        """
+        waiter = TaskWaiter(self, timeout=timeout, on_change=on_change,
+                            **kwargs)
+        waiter.wait()
+        return waiter
 
     def _logtail(self, **kwargs):
-        url = urlparse.urljoin(self._url_for() + '/', 'logs')
         payload = {}
         try:
             payload['offset'] = kwargs['offset']
         except KeyError:
             pass
-        return self._request('get', url=url, params=payload).response.content
+        return self._request('get', url=self._log_url(),
+                             params=payload).response.content
+
+    def _log_url(self):
+        return urlparse.urljoin(self._url_for() + '/', 'logs')
+
+    def _log(self, offset=None):
+        """The log from offset: '+n' skips the first n bytes, '-n' is
+        the last n.  A log that can't be read yet is empty."""
+        payload = {}
+        if offset is not None:
+            payload['offset'] = offset
+        r = self._request('get', url=self._log_url(), params=payload)
+        if not r:
+            return ''
+        return r.response.content
+
+    def stream_log(self, out, offset=None, chunk_size=STREAM_CHUNK_SIZE):
+        """Write the log from offset to out a chunk at a time, so memory
+        use doesn't grow with the log.  Returns the bytes written."""
+        payload = {}
+        if offset is not None:
+            payload['offset'] = offset
+        r = self.endpoint.requests.get(self._log_url(), params=payload,
+                                       stream=True)
+        written = 0
+        try:
+            # an error body is not log text
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            self.endpoint.requests.release(r)
+        return written
+
+    def _log_size(self):
+        """How many bytes have been logged, without reading them."""
+        r = self.endpoint.requests.get(self._log_url(),
+                                       params={'offset': '+0'}, stream=True)
+        try:
+            if 'content-length' in r.headers:
+                return int(r.headers['content-length'])
+            return len(r.content)
+        finally:
+            self.endpoint.requests.release(r)
+
+    def follow_logs(self, offset=0, **kwargs):
+        """A LogFollower over this task's log: iterate it for the text
+        logged from offset on, until the task completes."""
+        return LogFollower(self, offset=offset, **kwargs)
 
 
 class OpenCenterAdventure(OpenCenterObject):
@@ -0,0 +1,158 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Compact storage for large collections.
+
+A ColumnStore keeps one list per schema field instead of a dict per
+object, with repeated strings shared.  Rows are handed out as small
+views over it; a full OpenCenterObject is only built for a row when
+something other than a field read (a save, an fk traversal, a
+synthesized field) needs one.
+"""
+
+from client import OpenCenterObject
+
+
+class ColumnStore(object):
+    def __init__(self, endpoint, object_type, schema):
+        self.endpoint = endpoint
+        self.object_type = object_type
+        self.schema = schema
+        self.columns = dict((k, []) for k in schema.fields)
+        # keys the schema doesn't know about, by row
+        self.extra = {}
+        # full objects built for rows, by row
+        self.objects = {}
+        self._strings = {}
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def _intern(self, value):
+        if isinstance(value, basestring):
+            return self._strings.setdefault(value, value)
+        return value
+
+    def append(self, item):
+        index = self._rows
+        for k, column in self.columns.iteritems():
+            column.append(self._intern(item.get(k)))
+        extra = dict((k, v) for k, v in item.iteritems()
+                     if not k in self.columns)
+        if extra:
+            self.extra[index] = extra
+        self._rows += 1
+        return Row(self, index)
+
+    def attributes(self, index):
+        attributes = dict((k, column[index])
+                          for k, column in self.columns.iteritems()
+                          if column[index] is not None)
+        attributes.update(self.extra.get(index, {}))
+        return attributes
+
+    def materialize(self, index):
+        obj = self.objects.get(index)
+        if obj is None:
+            obj = self.endpoint._canonical(self.object_type,
+                                           self.attributes(index))
+            self.objects[index] = obj
+        return obj
+
+
+class Row(object):
+    """One row of a ColumnStore, read like an OpenCenterObject."""
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        object.__setattr__(self, 'store', store)
+        object.__setattr__(self, 'index', index)
+
+    def get(self, name, default=None):
+        # once a row has an object, that is the current copy
+        obj = self.store.objects.get(self.index)
+        if obj is not None:
+            if name in self.store.columns:
+                return getattr(obj, name)
+            return obj.attributes.get(name, default)
+
+        column = self.store.columns.get(name)
+        if column is not None:
+            return column[self.index]
+        return self.store.extra.get(self.index, {}).get(name, default)
+
+    @property
+    def schema(self):
+        return self.store.schema
+
+    @property
+    def object_type(self):
+        return self.store.object_type
+
+    @property
+    def attributes(self):
+        obj = self.store.objects.get(self.index)
+        if obj is not None:
+            return obj.attributes
+        return self.store.attributes(self.index)
+
+    def object(self):
+        """The full object for this row."""
+        return self.store.materialize(self.index)
+
+    def __getattr__(self, name):
+        if name in self.store.columns:
+            return self.get(name)
+        # probes like hasattr(row, '__dict__') shouldn't build an object
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.object(), name)
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+    def __setattr__(self, name, value):
+        setattr(self.object(), name, value)
+
+    def to_hash(self):
+        return self.object().to_hash()
+
+    def to_dict(self):
+        return self.to_hash()
+
+    def _resolved_value(self, key, fk_names=None):
+        value = self.get(key)
+        field = self.store.schema.fields[key]
+        if value and field.is_fk():
+            if fk_names is not None and \
+                    (field.fk()[0], int(value)) in fk_names:
+                return fk_names[(field.fk()[0], int(value))]
+            return self.object()._resolved_value(key)
+        return value
+
+    col_format = OpenCenterObject.__dict__['col_format']
+    row_format = OpenCenterObject.__dict__['row_format']
+
+    def __str__(self):
+        return self.row_format()
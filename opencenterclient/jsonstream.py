@@ -0,0 +1,155 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Incremental scanning of json documents that arrive in chunks.
+
+Only the structure is scanned here; each item found is handed back as
+raw json text, for whatever json decoder is in use to parse.
+"""
+
+import re
+
+
+_structural = re.compile(r'["{}\[\],:]')
+
+
+class _Buffer(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = ''
+
+    def refill(self, keep):
+        """Drop everything before keep and read another chunk.
+
+        Returns False at the end of the input.
+        """
+        for chunk in self.chunks:
+            if chunk:
+                self.text = self.text[keep:] + chunk
+                return True
+        return False
+
+
+def _string_end(buf, start, keep):
+    """Find the closing quote of the string opening at buf.text[start].
+
+    Returns (end, dropped), where dropped is how much of the buffer was
+    discarded to make room while reading.
+    """
+    dropped = 0
+    search = start + 1
+    while True:
+        end = buf.text.find('"', search)
+        if end == -1:
+            search = len(buf.text)
+            if not buf.refill(keep):
+                raise ValueError('unterminated string in json')
+            start -= keep
+            search -= keep
+            dropped += keep
+            keep = 0
+            continue
+
+        # an odd run of backslashes means the quote is escaped
+        backslashes = 0
+        while buf.text[end - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end, dropped
+        search = end + 1
+
+
+def iter_array(chunks, key):
+    """Yield the raw json text of each item in the array stored under key
+    in a top level json object, reading chunks only as they are needed.
+
+    Only the item being scanned is held in memory, so peak memory depends
+    on the largest item rather than on the size of the document.
+    """
+    buf = _Buffer(chunks)
+    pos = 0
+    depth = 0
+    current_key = None
+    last_string = None
+    in_array = False
+    # where the text of the item being scanned starts
+    start = None
+
+    while True:
+        match = _structural.search(buf.text, pos)
+        if match is None:
+            scanned = len(buf.text)
+            keep = start if start is not None else scanned
+            if not buf.refill(keep):
+                raise ValueError('json ended before the "%s" array' % key)
+            pos = scanned - keep
+            if start is not None:
+                start -= keep
+            continue
+
+        i = match.start()
+        c = buf.text[i]
+
+        if c == '"':
+            keep = start if start is not None else i
+            end, dropped = _string_end(buf, i, keep)
+            if dropped:
+                i -= dropped
+                if start is not None:
+                    start -= dropped
+            if depth == 1:
+                last_string = buf.text[i + 1:end]
+            pos = end + 1
+            continue
+
+        pos = i + 1
+
+        if c == ':':
+            if depth == 1:
+                current_key = last_string
+        elif c in '{[':
+            if c == '[' and depth == 1 and current_key == key:
+                in_array = True
+                start = pos
+            depth += 1
+        elif c in '}]':
+            depth -= 1
+            if in_array and depth == 2 and start is not None:
+                # a container item just closed
+                yield buf.text[start:pos].strip()
+                start = None
+            elif in_array and depth == 1:
+                # the end of the array itself
+                item = buf.text[start:i].strip() if start is not None else ''
+                if item:
+                    yield item
+                return
+        elif c == ',':
+            if in_array and depth == 2:
+                if start is not None:
+                    item = buf.text[start:i].strip()
+                    if item:
+                        yield item
+                start = pos
+            elif depth == 1:
+                current_key = None
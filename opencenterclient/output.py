@@ -0,0 +1,165 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Writing collections out as they are read."""
+
+import csv
+import json
+from itertools import islice
+
+
+MAX_COLUMN_WIDTH = 30
+# rows whose fk names are looked up together
+FK_BATCH_ROWS = 500
+
+
+class TableRenderer(object):
+    """Writes a LazyDict as the '|' separated table opencentercli prints,
+    a row at a time.
+
+    Column widths come from widths if given, otherwise from the first
+    sample rows, otherwise from every row (which means holding the whole
+    table, as str() of a LazyDict does).  With either of the first two,
+    rows are written as soon as they are read and memory use does not
+    grow with the table.
+    """
+    def __init__(self, lazy_dict, out, widths=None, sample=None,
+                 max_width=MAX_COLUMN_WIDTH):
+        self.lazy_dict = lazy_dict
+        self.out = out
+        self.widths = widths
+        self.sample = sample
+        self.max_width = max_width
+
+    def _measure(self, rows, fields, fk_names):
+        widths = {}
+        for field in fields:
+            widths[field] = max(
+                [len(str(x._resolved_value(field, fk_names))) + 1
+                 for x in rows] + [len(field.replace('_id', '')) + 1])
+            widths[field] = min(widths[field], self.max_width)
+        return widths
+
+    def _write_rows(self, rows, widths, fk_names):
+        for row in rows:
+            self.out.write(row.col_format(separator='|', widths=widths,
+                                          fk_names=fk_names) + '\n')
+
+    def render(self, rows=None):
+        lazy_dict = self.lazy_dict
+        lazy_dict._maybe_refresh_schema()
+        fields = lazy_dict.schema.printable_cols()
+        if rows is None:
+            rows = iter(lazy_dict)
+        rows = iter(rows)
+
+        if self.widths is None and self.sample is None:
+            head = list(rows)
+        else:
+            head = list(islice(rows, self.sample or FK_BATCH_ROWS))
+        if not head:
+            return
+
+        fk_names = lazy_dict._fk_names(head, fields)
+        if self.widths is None:
+            widths = self._measure(head, fields, fk_names)
+        else:
+            widths = dict((k, len(k.replace('_id', '')) + 1)
+                          for k in fields)
+            widths.update(self.widths)
+
+        self.out.write(''.join(['%%-%ds|' % widths[k] % k.replace('_id', '')
+                                for k in fields]) + '\n')
+        self.out.write(''.join([('-' * widths[k]) + '|'
+                                for k in fields]) + '\n')
+        self._write_rows(head, widths, fk_names)
+        del head
+
+        while True:
+            batch = list(islice(rows, FK_BATCH_ROWS))
+            if not batch:
+                break
+            self._write_rows(batch, widths,
+                             lazy_dict._fk_names(batch, fields))
+
+
+RECORD_FORMATS = ['jsonl', 'csv', 'tsv']
+
+
+def record_fields(schema):
+    """The columns of a csv or tsv record: id, then the rest by name."""
+    fields = sorted(schema.fields)
+    if 'id' in fields:
+        fields.remove('id')
+        fields.insert(0, 'id')
+    return fields
+
+
+def _json_default(value):
+    # RawJSON, for json fields that were set from text and not read since
+    decode = getattr(value, 'decode', None)
+    if decode is None:
+        raise TypeError('%r is not JSON serializable' % (value,))
+    return decode()
+
+
+class RecordWriter(object):
+    """Writes objects as one compact record per line, for other tools to
+    read: JSON Lines, or CSV/TSV with a header line.
+
+    fk columns are written as ids; no names are looked up.
+    """
+    def __init__(self, out, fmt, fields):
+        if not fmt in RECORD_FORMATS:
+            raise ValueError('unknown output format "%s"' % fmt)
+        self.out = out
+        self.fmt = fmt
+        self.fields = fields
+        self.csv = None
+        if fmt != 'jsonl':
+            self.csv = csv.writer(out, lineterminator='\n',
+                                  delimiter='\t' if fmt == 'tsv' else ',')
+            self.csv.writerow(fields)
+
+    def _cell(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, sort_keys=True, separators=(',', ':'))
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    def write(self, obj):
+        attributes = obj.attributes
+        if self.csv is None:
+            self.out.write(json.dumps(attributes, sort_keys=True,
+                                      separators=(',', ':'),
+                                      default=_json_default) + '\n')
+        else:
+            self.csv.writerow([self._cell(getattr(obj, k))
+                               for k in self.fields])
+
+    def write_all(self, objects):
+        for obj in objects:
+            self.write(obj)
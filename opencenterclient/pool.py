@@ -0,0 +1,188 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+
+import Queue
+import sys
+import threading
+
+
+DEFAULT_WORKERS = 10
+
+
+class Future(object):
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise RuntimeError('timed out waiting for result')
+
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise RuntimeError('timed out waiting for result')
+
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class WorkerPool(object):
+    """A bounded pool of daemon threads running submitted calls.
+
+    Threads are only started as work arrives, up to max_workers.
+    """
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def submit(self, fn, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError('cannot submit to a pool after shutdown')
+
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+
+        with self._lock:
+            if len(self._threads) < self.max_workers and \
+                    self._queue.qsize() > self._idle:
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def map(self, fn, iterable):
+        return gather([self.submit(fn, x) for x in iterable])
+
+    def shutdown(self, wait=True):
+        self._shutdown = True
+        for thread in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            work = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+
+            if work is None:
+                return
+
+            future, fn, args, kwargs = work
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except:
+                future.set_exc_info(sys.exc_info())
+
+
+def gather(futures):
+    """Wait for all futures, returning their results in order."""
+    return [f.result() for f in futures]
+
+
+def when_all(futures):
+    """A future for the results of several others, in order.
+
+    Unlike gather this does not block, so it is safe to use from inside
+    the pool itself.
+    """
+    combined = Future()
+    futures = list(futures)
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _one_done(future):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] != 0:
+                return
+        try:
+            combined.set_result(gather(futures))
+        except:
+            combined.set_exc_info(sys.exc_info())
+
+    if not futures:
+        combined.set_result([])
+    for f in futures:
+        f.add_done_callback(_one_done)
+    return combined
+
+
+def as_completed(futures):
+    """Yield futures in the order they finish."""
+    finished = Queue.Queue()
+    futures = list(futures)
+    for f in futures:
+        f.add_done_callback(finished.put)
+
+    for i in range(len(futures)):
+        yield finished.get()
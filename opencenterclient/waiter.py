@@ -0,0 +1,306 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Waiting for tasks to finish without hammering the api."""
+
+import random
+import time
+
+import requests
+
+
+DEFAULT_INITIAL_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+# someone is usually watching a log being followed
+DEFAULT_LOG_MAX_DELAY = 5.0
+BACKOFF_FACTOR = 2
+# a ?poll answered sooner than this came straight back, rather than being
+# held open by the server until the task changed
+LONG_POLL_MIN = 1.0
+
+COMPLETE_STATES = ['done', 'timeout', 'cancelled']
+# tasks looked up by one filter request
+WATCH_FILTER_IDS = 100
+
+
+def backoff_delays(initial=DEFAULT_INITIAL_DELAY, maximum=DEFAULT_MAX_DELAY,
+                   factor=BACKOFF_FACTOR):
+    """Yield waits growing by factor from initial up to maximum.
+
+    Half of each wait is random, so that many clients waiting on the
+    same thing don't all poll in step.
+    """
+    delay = float(initial)
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(delay * factor, maximum)
+
+
+class _Poller(object):
+    def __init__(self, timeout, initial_delay, max_delay, on_change):
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.on_change = on_change
+        self.requests = 0
+        self.elapsed = None
+        self.deadline = None
+
+    def _start(self):
+        self.started = time.time()
+        if self.timeout is not None:
+            self.deadline = self.started + self.timeout
+
+    def _delays(self):
+        return backoff_delays(self.initial_delay, self.max_delay)
+
+    def _remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def _sleep(self, delay):
+        remaining = self._remaining()
+        if remaining is not None:
+            delay = min(delay, max(remaining, 0))
+        time.sleep(delay)
+
+
+class TaskWaiter(_Poller):
+    """Polls a task until it completes, or timeout seconds pass.
+
+    Polls are ?poll requests, which the server may hold open until the
+    task changes.  A poll that was held open is followed by the next one
+    straight away; one that came back at once is followed by a backoff
+    wait, which starts over from initial_delay when the state changes.
+
+    on_change is called with the task whenever its state is seen to
+    change, starting with the state it has when the wait begins.
+    Afterwards, requests is how many requests the wait made and elapsed
+    how long it took.
+    """
+    def __init__(self, task, timeout=None,
+                 initial_delay=DEFAULT_INITIAL_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, on_change=None):
+        super(TaskWaiter, self).__init__(timeout, initial_delay, max_delay,
+                                         on_change)
+        self.task = task
+        # every state seen, in order
+        self.states = []
+
+    def _timed_out(self):
+        raise RuntimeError('timed out waiting for task %s after %ss' %
+                           (self.task.id, self.timeout))
+
+    def _poll(self, poll):
+        """Fetch the task, and return whether its state changed."""
+        kwargs = {}
+        remaining = self._remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                self._timed_out()
+            # a long poll mustn't hold us past the deadline
+            kwargs['timeout'] = remaining
+
+        self.requests += 1
+        try:
+            r = self.task._request('get', poll=poll, **kwargs)
+        except requests.exceptions.Timeout:
+            self._timed_out()
+        if r.status_code == 404:
+            raise KeyError("OpenCenterTask id '%s' not found" % self.task.id)
+
+        state = self.task.state
+        if self.states and self.states[-1] == state:
+            return False
+        self.states.append(state)
+        if self.on_change is not None:
+            self.on_change(self.task)
+        return True
+
+    def wait(self):
+        self._start()
+        delays = self._delays()
+        self._poll(False)
+        while not self.task.state in COMPLETE_STATES:
+            sent = time.time()
+            if self._poll(True):
+                delays = self._delays()
+            elif time.time() - sent < LONG_POLL_MIN:
+                self._sleep(next(delays))
+
+        self.elapsed = time.time() - self.started
+        return self.task
+
+
+class TaskWatcher(_Poller):
+    """Waits on many tasks at once.
+
+    tasks may be ids or task objects.  Each round fetches every task
+    still pending with one filter request (per WATCH_FILTER_IDS of them),
+    so the requests made grow with the rounds rather than with the tasks
+    times the rounds.  The filters are revalidated rather than refetched
+    while the same tasks are pending, so a round that finds nothing
+    changed builds no objects.  Rounds are spaced by backoff, which
+    starts over whenever some task changes.
+
+    Iterating yields tasks as they complete; wait() returns them all in
+    the order they completed.  on_change, requests and elapsed are as
+    for TaskWaiter, and timeout raises RuntimeError.
+    """
+    def __init__(self, endpoint, tasks, timeout=None,
+                 initial_delay=DEFAULT_INITIAL_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, on_change=None):
+        super(TaskWatcher, self).__init__(timeout, initial_delay, max_delay,
+                                          on_change)
+        self.endpoint = endpoint
+        # last state seen, by id, for the tasks not yet complete
+        self.pending = dict((getattr(x, 'id', x), None) for x in tasks)
+        # the filter views of the last round, kept for conditional gets
+        self._views = {}
+
+    def _timed_out(self):
+        raise RuntimeError('timed out waiting for tasks %s after %ss' %
+                           (', '.join([str(x) for x in sorted(self.pending)]),
+                            self.timeout))
+
+    def _fetch(self, ids):
+        # client imports this module
+        from client import LazyDict
+
+        filter_string = ' or '.join(['(id=%d)' % x for x in ids])
+        view = self._views.get(filter_string)
+        if view is None:
+            view = LazyDict('task', self.endpoint, filter_string)
+        self.requests += 1
+        view._refresh(force=True)
+        return filter_string, view
+
+    def _round(self):
+        """Fetch the pending tasks, returning whether any changed and
+        the ones that completed."""
+        changed = False
+        complete = []
+        views = {}
+        ids = sorted(self.pending)
+        for i in range(0, len(ids), WATCH_FILTER_IDS):
+            filter_string, view = self._fetch(ids[i:i + WATCH_FILTER_IDS])
+            views[filter_string] = view
+            for key in ids[i:i + WATCH_FILTER_IDS]:
+                task = view.dict.get(key)
+                if task is None:
+                    raise KeyError("OpenCenterTask id '%s' not found" % key)
+                if task.state == self.pending[key]:
+                    continue
+                changed = True
+                self.pending[key] = task.state
+                if self.on_change is not None:
+                    self.on_change(task)
+                if task.state in COMPLETE_STATES:
+                    del self.pending[key]
+                    complete.append(task)
+        self._views = views
+        return changed, complete
+
+    def __iter__(self):
+        self._start()
+        delays = self._delays()
+        while True:
+            changed, complete = self._round()
+            for task in complete:
+                yield task
+            if not self.pending:
+                break
+
+            if changed:
+                delays = self._delays()
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                self._timed_out()
+            self._sleep(next(delays))
+
+        self.elapsed = time.time() - self.started
+
+    def wait(self):
+        return list(self)
+
+
+class LogFollower(_Poller):
+    """Yields what a task logs as it is logged, until the task completes.
+
+    Each poll asks for the log from the byte offset read up to, so only
+    new bytes are fetched.  Polls back off while the log is quiet and
+    start over when it grows.  A quiet poll also checks on the task, and
+    once it has completed the log is read a last time and iteration
+    stops.
+
+    offset is where to start: a byte count into the log, or if negative,
+    a byte count back from its end.  requests, elapsed and timeout are
+    as for TaskWaiter.
+    """
+    def __init__(self, task, offset=0, timeout=None,
+                 initial_delay=DEFAULT_INITIAL_DELAY,
+                 max_delay=DEFAULT_LOG_MAX_DELAY):
+        super(LogFollower, self).__init__(timeout, initial_delay, max_delay,
+                                          None)
+        self.task = task
+        self.offset = offset
+
+    def _timed_out(self):
+        raise RuntimeError('timed out following logs of task %s after %ss'
+                           % (self.task.id, self.timeout))
+
+    def _read(self):
+        self.requests += 1
+        text = self.task._log('+%d' % self.offset)
+        self.offset += len(text)
+        return text
+
+    def __iter__(self):
+        self._start()
+        if self.offset < 0:
+            self.requests += 1
+            self.offset = max(self.task._log_size() + self.offset, 0)
+
+        delays = self._delays()
+        while True:
+            text = self._read()
+            if text:
+                yield text
+                delays = self._delays()
+            else:
+                self.requests += 1
+                self.task._request_get()
+                if self.task.state in COMPLETE_STATES:
+                    # whatever was logged before it completed
+                    text = self._read()
+                    if text:
+                        yield text
+                    break
+
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                self._timed_out()
+            self._sleep(next(delays))
+
+        self.elapsed = time.time() - self.started
@@ -0,0 +1,316 @@
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""A small in-process stand-in for the OpenCenter API, for tests and
+benchmarks.  It keeps connections alive and records every request it
+serves."""
+
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import json
+import re
+import socket
+import sys
+import threading
+import time
+import urlparse
+
+
+SCHEMAS = {
+    'nodes': {
+        'id': {'type': 'INTEGER', 'unique': True, 'primary_key': True},
+        'name': {'type': 'VARCHAR(255)', 'unique': True},
+        'attrs': {'type': 'JSON', 'unique': False},
+        'facts': {'type': 'JSON', 'unique': False}
+    },
+    'tasks': {
+        'id': {'type': 'INTEGER', 'unique': True, 'primary_key': True},
+        'node_id': {'type': 'INTEGER', 'unique': False, 'fk': 'nodes.id'},
+        'action': {'type': 'VARCHAR(40)', 'unique': False},
+        'state': {'type': 'VARCHAR(40)', 'unique': False},
+        'payload': {'type': 'JSON', 'unique': False},
+        'result': {'type': 'JSON', 'unique': False}
+    },
+    'facts': {
+        'id': {'type': 'INTEGER', 'unique': True, 'primary_key': True},
+        'node_id': {'type': 'INTEGER', 'unique': False, 'fk': 'nodes.id'},
+        'key': {'type': 'VARCHAR(64)', 'unique': False},
+        'value': {'type': 'JSON_ENTRY', 'unique': False}
+    },
+    'attrs': {
+        'id': {'type': 'INTEGER', 'unique': True, 'primary_key': True},
+        'node_id': {'type': 'INTEGER', 'unique': False, 'fk': 'nodes.id'},
+        'key': {'type': 'VARCHAR(64)', 'unique': False},
+        'value': {'type': 'JSON_ENTRY', 'unique': False}
+    },
+    'adventures': {
+        'id': {'type': 'INTEGER', 'unique': True, 'primary_key': True},
+        'name': {'type': 'VARCHAR(30)', 'unique': True},
+        'dsl': {'type': 'JSON', 'unique': False},
+        'criteria': {'type': 'VARCHAR(255)', 'unique': False}
+    }
+}
+
+_term_re = re.compile(
+    r"\s*(?P<field>[a-z_]+)\s*(?P<op>>=|<=|!=|=|<|>)\s*"
+    r"(?P<value>'[^']*'|\"[^\"]*\"|-?\d+)\s*")
+
+
+def _evaluate(expr, item):
+    # just enough of the opencenter filter language for tests:
+    # comparisons joined by and/or, with parentheses
+    expr = expr.strip()
+    depth = 0
+    for joiner in [' or ', ' and ']:
+        depth = 0
+        for idx in range(len(expr)):
+            if expr[idx] == '(':
+                depth += 1
+            elif expr[idx] == ')':
+                depth -= 1
+            elif depth == 0 and expr.startswith(joiner, idx):
+                left = _evaluate(expr[:idx], item)
+                right = _evaluate(expr[idx + len(joiner):], item)
+                if joiner == ' or ':
+                    return left or right
+                return left and right
+
+    if expr.startswith('(') and expr.endswith(')'):
+        return _evaluate(expr[1:-1], item)
+
+    match = _term_re.match(expr)
+    if not match:
+        raise ValueError('cannot parse filter "%s"' % expr)
+
+    field, op, value = match.group('field', 'op', 'value')
+    if value[0] in '\'"':
+        value = value[1:-1]
+    else:
+        value = int(value)
+
+    actual = item.get(field)
+    return {'=': lambda a, b: a == b,
+            '!=': lambda a, b: a != b,
+            '<': lambda a, b: a < b,
+            '>': lambda a, b: a > b,
+            '<=': lambda a, b: a <= b,
+            '>=': lambda a, b: a >= b}[op](actual, value)
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = '' if body is None else json.dumps(body)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        if self.command == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.getheader('if-none-match') == etag:
+                status, data = 304, ''
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.record(self, len(data))
+
+    def _body(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _route(self):
+        url = urlparse.urlparse(self.path)
+        parts = [x for x in url.path.split('/') if x]
+        return parts, urlparse.parse_qs(url.query, keep_blank_values=True)
+
+    def do_GET(self):
+        parts, query = self._route()
+        store = self.server.store
+
+        if parts == ['schema']:
+            return self._send(200, {'schema': {'objects': SCHEMAS.keys()}})
+
+        if not parts or parts[0] not in SCHEMAS:
+            return self._send(404, {'message': 'not found'})
+
+        plural = parts[0]
+        if len(parts) == 1:
+            return self._send(200, {plural: store[plural].values()})
+
+        if parts[1] == 'schema':
+            return self._send(200, {'schema': SCHEMAS[plural]})
+
+        if 'poll' in query and self.server.poll_delay:
+            time.sleep(self.server.poll_delay)
+
+        item = store[plural].get(int(parts[1]))
+        if item is None:
+            return self._send(404, {'message': 'not found'})
+
+        if len(parts) == 3 and parts[2] == 'logs':
+            log = self.server.logs.get(item['id'], '')
+            # '-n' is the last n bytes, '+n' skips the first n
+            log = log[int(query.get('offset', ['+0'])[0]):]
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(log)))
+            self.end_headers()
+            self.wfile.write(log)
+            self.server.record(self, len(log))
+            return
+
+        return self._send(200, {plural[:-1]: item})
+
+    def do_POST(self):
+        parts, query = self._route()
+        store = self.server.store
+        body = self._body()
+
+        # a solved plan creates what the 409 below held back
+        if parts == ['plan'] and self.server.plan_for:
+            plural = self.server.plan_for
+            item = dict((k, v) for k, v in body.items()
+                        if k in SCHEMAS[plural])
+            item['id'] = self.server.next_id(plural)
+            store[plural][item['id']] = item
+            return self._send(201, {plural[:-1]: item})
+
+        if not parts or parts[0] not in SCHEMAS:
+            return self._send(404, {'message': 'not found'})
+
+        plural = parts[0]
+        if len(parts) == 2 and parts[1] == 'filter':
+            matches = [x for x in store[plural].values()
+                       if _evaluate(body['filter'], x)]
+            return self._send(200, {plural: matches})
+
+        if plural == self.server.plan_for:
+            return self._send(409, {'plan': []})
+
+        item = dict((k, v) for k, v in body.items() if k in SCHEMAS[plural])
+        item['id'] = self.server.next_id(plural)
+        store[plural][item['id']] = item
+        return self._send(201, {plural[:-1]: item})
+
+    def do_PUT(self):
+        parts, query = self._route()
+        store = self.server.store
+        # read the body even for a 404, or it would be taken for the
+        # next request on the connection
+        body = self._body()
+        item = store.get(parts[0], {}).get(int(parts[1]))
+        if item is None:
+            return self._send(404, {'message': 'not found'})
+
+        item.update(dict((k, v) for k, v in body.items()
+                         if k in SCHEMAS[parts[0]] and k != 'id'))
+        return self._send(200, {parts[0][:-1]: item})
+
+    def do_DELETE(self):
+        parts, query = self._route()
+        if self.server.store.get(parts[0], {}).pop(int(parts[1]),
+                                                   None) is None:
+            return self._send(404, {'message': 'not found'})
+        return self._send(200, {'status': 200, 'message': 'deleted'})
+
+
+class FakeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeHandler)
+        self.store = dict((k, {}) for k in SCHEMAS)
+        self.logs = {}
+        self.delay = 0
+        # how long ?poll requests are held open
+        self.poll_delay = 0
+        # a plural whose creates need a plan solved through /plan/
+        self.plan_for = None
+        self.requests = []
+        self.request_times = []
+        self.bytes_sent = 0
+        self.ports = set()
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def handle_error(self, request, client_address):
+        # clients are allowed to hang up part way through a response
+        if not issubclass(sys.exc_info()[0], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request,
+                                                   client_address)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def add(self, plural, **item):
+        if 'id' not in item:
+            item['id'] = self.next_id(plural)
+        for field in SCHEMAS[plural]:
+            item.setdefault(field, None)
+        self.store[plural][item['id']] = item
+        return item
+
+    def next_id(self, plural):
+        with self._lock:
+            existing = self.store[plural].keys() + [self._ids.get(plural, 0)]
+            self._ids[plural] = max(existing) + 1
+            return self._ids[plural]
+
+    def record(self, handler, nbytes):
+        with self._lock:
+            self.requests.append((handler.command, handler.path))
+            self.request_times.append(time.time())
+            self.bytes_sent += nbytes
+            self.ports.add(handler.client_address[1])
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = []
+            self.request_times = []
+            self.bytes_sent = 0
+            self.ports = set()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,909 @@
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import requests
+import opencenterclient
+import opencenterclient.asyncclient
+import opencenterclient.cache
+import opencenterclient.client
+import opencenterclient.columnar
+import opencenterclient.jsonstream
+import opencenterclient.output
+import opencenterclient.waiter
+
+from tests.fakeserver import FakeServer
+
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer().start()
+        self.server.add('nodes', id=1, name='workspace')
+        self.server.add('nodes', id=2, name='unprovisioned', attrs={})
+        self.server.add('tasks', id=1, node_id=2, action='test',
+                        state='done', result={'result_code': 0})
+        self.endpoints = []
+
+    def tearDown(self):
+        for ep in self.endpoints:
+            ep.requests.close()
+        self.server.stop()
+
+    def endpoint(self, **kwargs):
+        ep = opencenterclient.client.OpenCenterEndpoint(self.server.url,
+                                                        **kwargs)
+        self.endpoints.append(ep)
+        return ep
+
+    def test_session_reuses_connections(self):
+        ep = self.endpoint(pool_size=2)
+        ep.nodes.keys()
+        ep.tasks[1]
+        ep.nodes[2].name = 'renamed'
+        ep.nodes[2].save()
+
+        stats = ep.requests.connection_stats()
+        self.assertEqual(stats['requests'], len(self.server.requests))
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], stats['requests'] - 1)
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_capabilities_detected_once(self):
+        caps = opencenterclient.client.requests_capabilities()
+        self.assertTrue(caps is
+                        opencenterclient.client.requests_capabilities())
+        self.assertTrue(caps['ssl_kwargs'])
+        self.assertTrue(self.endpoint().requests.capabilities is caps)
+
+    def test_async_endpoint_overlaps_requests(self):
+        for i in range(3, 9):
+            self.server.add('nodes', id=i, name='node-%d' % i)
+        ep = opencenterclient.asyncclient.AsyncOpenCenterEndpoint(
+            self.server.url, max_workers=6)
+        self.endpoints.append(ep.sync)
+        ep.load_schemas(['node', 'task']).result()
+
+        self.server.delay = 0.2
+        start = time.time()
+        nodes = ep.nodes.get_many(range(3, 9)).result()
+        elapsed = time.time() - start
+
+        self.assertEqual([x.name for x in nodes],
+                         ['node-%d' % i for i in range(3, 9)])
+        self.assertTrue(elapsed < 0.8, elapsed)
+
+        tasks = ep.tasks.filter('node_id=2').values().result()
+        self.assertEqual([x.id for x in tasks], [1])
+        done = ep.wait_for_complete(tasks[0]).result()
+        self.assertTrue(done.complete)
+        ep.close()
+
+    def test_async_endpoint_cold_schemas(self):
+        for i in range(3, 30):
+            self.server.add('nodes', id=i, name='node-%d' % i)
+        ep = opencenterclient.asyncclient.AsyncOpenCenterEndpoint(
+            self.server.url, max_workers=8)
+        self.endpoints.append(ep.sync)
+        self.server.delay = 0.05
+        self.server.reset_stats()
+
+        nodes = ep.nodes.get_many(range(1, 30)).result()
+        self.assertEqual([x.id for x in nodes], range(1, 30))
+        self.assertEqual(self.server.requests.count(('GET', '/nodes/schema')),
+                         1)
+        # and they all share one generated class
+        self.assertTrue(all(isinstance(x, type(nodes[0])) for x in nodes))
+        ep.close()
+
+    def test_async_endpoint_options(self):
+        ep = opencenterclient.asyncclient.AsyncOpenCenterEndpoint(
+            self.server.url, pool_size=3, columnar=True, page_size=1)
+        self.endpoints.append(ep.sync)
+        self.assertEqual(ep.pool.max_workers, 3)
+        self.assertEqual(ep.sync.nodes.page_size, 1)
+
+        nodes = ep.nodes.values().result()
+        self.assertEqual(sorted(x.name for x in nodes),
+                         ['unprovisioned', 'workspace'])
+        self.assertTrue(all(isinstance(x, opencenterclient.columnar.Row)
+                            for x in nodes))
+        ep.close()
+
+    def test_schema_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        def schema_requests():
+            return [x for x in self.server.requests if 'schema' in x[1]]
+
+        str(self.endpoint(schema_cache=cache_dir).nodes)
+        self.assertEqual(len(schema_requests()), 2)
+
+        # a warm cache means no schema requests at all
+        self.server.reset_stats()
+        str(self.endpoint(schema_cache=cache_dir).nodes)
+        self.assertEqual(schema_requests(), [])
+        self.assertEqual(len(self.server.requests), 1)
+
+        # once expired, entries are revalidated rather than refetched
+        self.server.reset_stats()
+        cache = opencenterclient.cache.SchemaCache(self.server.url,
+                                                   cache_dir=cache_dir,
+                                                   ttl=0)
+        ep = self.endpoint(schema_cache=cache)
+        self.assertEqual(ep.get_schema('node').friendly_name, 'name')
+        self.assertEqual(len(schema_requests()), 2)
+        self.assertEqual(self.server.bytes_sent, 0)
+
+    def test_request_logging(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('opencenter.endpoint')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, logger.level)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('formatted a request with debug off')
+
+        logger.setLevel(logging.WARNING)
+        ep = self.endpoint()
+        ep.requests.http_log_req = ep.requests.http_log_resp = fail
+        ep.nodes.keys()
+        self.assertEqual(records, [])
+
+        logger.setLevel(logging.DEBUG)
+        ep = self.endpoint()
+        ep.requests.log_format = 'structured'
+        ep.tasks[1]
+        record = [x for x in records if hasattr(x, 'method')][-1]
+        self.assertEqual(record.method, 'GET')
+        self.assertEqual(record.url, self.server.url + '/tasks/1')
+        self.assertEqual(record.status, 200)
+        self.assertTrue(int(record.bytes) > 0)
+        self.assertTrue(record.latency >= 0)
+
+    def test_json_decoded_once(self):
+        decoded = []
+
+        def loads(s):
+            decoded.append(s)
+            return json.loads(s)
+
+        opencenterclient.client.set_json_decoder(loads)
+        self.addCleanup(opencenterclient.client.set_json_decoder)
+
+        ep = self.endpoint()
+        decoded[:] = []
+        r = ep.requests.get(self.server.url + '/nodes/')
+        self.assertEqual(decoded, [])
+        self.assertEqual(len(r.json['nodes']), 2)
+        self.assertEqual(len(r.json['nodes']), 2)
+        self.assertEqual(len(decoded), 1)
+        self.assertEqual(r.status_code, 200)
+
+        self.assertRaises(ValueError,
+                          opencenterclient.client.set_json_decoder,
+                          'no_such_json_module')
+
+    def test_iter_array_is_incremental(self):
+        body = json.dumps({'other': ['x'],
+                           'tasks': [{'id': i, 'name': 'a"}],\\'}
+                                     for i in range(100)]})
+        chunks_read = []
+
+        def chunks():
+            for i in range(0, len(body), 7):
+                chunks_read.append(i)
+                yield body[i:i + 7]
+
+        items = opencenterclient.jsonstream.iter_array(chunks(), 'tasks')
+        self.assertEqual(json.loads(next(items))['id'], 0)
+        self.assertTrue(len(chunks_read) * 7 < len(body) / 10)
+        self.assertEqual([json.loads(x) for x in items],
+                         json.loads(body)['tasks'][1:])
+
+    def test_streaming_collection(self):
+        for i in range(2, 200):
+            self.server.add('tasks', id=i, node_id=1, action='x' * 100,
+                            state='done')
+        ep = self.endpoint(streaming=True)
+
+        tasks = iter(ep.tasks)
+        self.assertEqual(next(tasks).id, 1)
+        self.assertEqual(len(list(tasks)), 198)
+        self.assertEqual(len(ep.tasks.cached_keys()), 0)
+
+        # stopping early must not leave half a response on the connection
+        self.assertEqual(ep.tasks.filter('node_id=1').first().id, 2)
+        self.assertEqual(ep.nodes[1].name, 'workspace')
+        self.assertEqual(ep.tasks.first().id, 1)
+
+    def test_conditional_refresh(self):
+        for i in range(3, 50):
+            self.server.add('nodes', id=i, name='node-%d' % i)
+        ep = self.endpoint()
+        before = ep.nodes.values()
+        ep.nodes.dirty = True
+        node = ep.nodes[3]
+
+        self.server.reset_stats()
+        ep.nodes.dirty = True
+        self.assertEqual(ep.nodes.values(), before)
+        ep.nodes.dirty = True
+        self.assertEqual(node.name, ep.nodes[3].name)
+        self.assertEqual(self.server.bytes_sent, 0)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # filters are posted, so they can't 304, but an unchanged body
+        # still reuses the objects built last time
+        nodes = ep.nodes.filter('id > 40')
+        first = nodes.values()
+        nodes.dirty = True
+        self.assertTrue(all(a is b for a, b in zip(first, nodes.values())))
+
+        # the attributes are only digested when a 304 is possible, and
+        # once per response
+        cls = type(node)
+        digested = []
+        digest = cls._attributes_digest
+
+        def counting(obj):
+            digested.append(obj.id)
+            return digest(obj)
+        cls._attributes_digest = counting
+        self.addCleanup(delattr, cls, '_attributes_digest')
+        node._request_get()
+        self.assertEqual(digested, [3])
+        node.name = 'edited'
+        node._request_get()
+        self.assertEqual(node.name, 'node-3')
+        self.assertEqual(digested, [3, 3])
+
+        # a real change still comes through
+        self.server.store['nodes'][3]['name'] = 'changed'
+        ep.nodes.dirty = True
+        self.assertEqual(ep.nodes[3].name, 'changed')
+        ep.nodes.dirty = True
+        names = dict((n.id, n.name) for n in ep.nodes.values())
+        self.assertEqual(names[3], 'changed')
+
+    def test_write_invalidates_only_what_it_touches(self):
+        for i in range(1, 21):
+            self.server.add('facts', id=i, node_id=1 + i % 2,
+                            key='fact-%d' % i, value=i)
+        ep = self.endpoint()
+        facts = dict((x.id, x) for x in ep.facts.values())
+        odd = ep.facts.filter('node_id=2')
+        by_key = ep.facts.filter("key='fact-3'")
+        odd.values()
+        by_key.values()
+        ep.nodes[1]
+        ep.nodes[2]
+
+        self.server.reset_stats()
+        fact = facts[3]
+        fact.value = 'changed'
+        fact.save()
+        self.assertEqual(self.server.requests, [('PUT', '/facts/3')])
+
+        # neither the table nor the views go back to the server
+        self.assertEqual(ep.facts[3].value, 'changed')
+        self.assertEqual(len(ep.facts.values()), 20)
+        self.assertEqual(odd[3].value, 'changed')
+        self.assertEqual(len(by_key.values()), 1)
+        self.assertEqual(len(self.server.requests), 1)
+
+        # the node the fact hangs off is revalidated, and only that one
+        ep.nodes[1]
+        ep.nodes[2]
+        self.assertEqual(self.server.requests[1:], [('GET', '/nodes/2')])
+
+        # moving the fact to another node changes what 'node_id=2' matches
+        self.server.reset_stats()
+        fact.node_id = 1
+        fact.save()
+        self.assertEqual(len(odd.values()), 9)
+        self.assertEqual(len(by_key.values()), 1)
+        self.assertEqual(self.server.requests,
+                         [('PUT', '/facts/3'), ('POST', '/facts/filter')])
+
+        fact.delete()
+        self.assertFalse(3 in ep.facts.keys())
+        self.assertEqual(len(by_key.values()), 0)
+
+        new_fact = ep.facts.new(node_id=2, key='new', value=1)
+        new_fact.save()
+        self.assertTrue(new_fact.id in ep.facts.keys())
+        self.assertEqual(len(odd.values()), 10)
+
+    def test_write_through_plan_dirties_table(self):
+        self.server.add('facts', id=1, node_id=1, key='a', value=1)
+        self.server.plan_for = 'facts'
+        ep = self.endpoint(interactive=True)
+        by_node = ep.facts.filter('node_id=1')
+        self.assertEqual(ep.facts.keys(), [1])
+        self.assertEqual(by_node.keys(), [1])
+
+        fact = ep.facts.new(node_id=1, key='b', value=2)
+        fact.save()
+        self.assertEqual(fact.id, 2)
+        self.assertEqual(sorted(ep.facts.keys()), [1, 2])
+        self.assertEqual(sorted(by_node.keys()), [1, 2])
+
+    def test_identity_map(self):
+        self.server.add('tasks', id=2, node_id=2, action='other',
+                        state='running')
+        ep = self.endpoint()
+
+        node = ep.nodes[2]
+        self.server.reset_stats()
+        self.assertTrue(ep.tasks[1].node is node)
+        self.assertTrue(ep.tasks.filter('node_id=2').values()[0].node is node)
+        self.assertTrue(node.tasks[2] is ep.tasks[2])
+        self.assertTrue(ep.nodes.filter('id=2').first() is node)
+        self.assertTrue(dict((x.id, x) for x in ep.nodes.values())[2]
+                        is node)
+        self.assertEqual([x for x in self.server.requests
+                          if x[0] == 'GET' and x[1].startswith('/nodes/')],
+                         [('GET', '/nodes/')])
+        self.assertFalse(('GET', '/tasks/2') in self.server.requests)
+
+        # a refresh through any path updates the one object
+        self.server.store['nodes'][2]['name'] = 'renamed'
+        ep.nodes.filter('name="renamed"').values()
+        self.assertEqual(node.name, 'renamed')
+
+        # but leaves fields set locally and not yet saved alone
+        node.name = 'edited'
+        self.server.store['nodes'][2]['attrs'] = {'x': 1}
+        ep.nodes.filter('id=2').values()
+        self.assertEqual(node.name, 'edited')
+        self.assertEqual(node.attrs, {'x': 1})
+        self.assertEqual(node.changed_fields, set(['name']))
+        node.save()
+        self.assertEqual(self.server.store['nodes'][2]['name'], 'edited')
+
+    def test_filter_cache(self):
+        cache = opencenterclient.cache.FilterCache(ttl=60, max_size=2)
+        ep = self.endpoint(filter_cache=cache)
+        node = ep.nodes[2]
+        ep.get_schema('task')
+
+        self.server.reset_stats()
+        for i in range(5):
+            self.assertEqual(len(ep.tasks.filter('node_id=2').values()), 1)
+            self.assertEqual(len(node.tasks.values()), 1)
+        self.assertEqual(len(ep.tasks.filter('node_id = 2 ').values()), 1)
+        self.assertEqual(self.server.requests, [('POST', '/tasks/filter')])
+        self.assertEqual(cache.stats()['hits'], 10)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        # writes invalidate the cached view, as they do any other
+        task = ep.tasks.new(node_id=2, action='x', state='pending')
+        task.save()
+        self.assertEqual(len(node.tasks.values()), 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        cache.ttl = 0
+        node.tasks.values()
+        self.assertEqual(cache.stats()['expired'], 1)
+
+        ep.nodes.filter('id=1')
+        ep.nodes.filter('id=2')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(len(self.server.requests), 4)
+
+        self.assertEqual(opencenterclient.cache.normalize_filter(
+            ' name = "a  b"   and (id >= 1)'), 'name="a  b" and(id>=1)')
+
+    def test_table_render_batches_fk_lookups(self):
+        for i in range(3, 13):
+            self.server.add('nodes', id=i, name='node-%d' % i)
+        for i in range(2, 60):
+            self.server.add('tasks', id=i, node_id=1 + i % 12, action='x',
+                            state='done')
+        self.server.add('tasks', id=60, node_id=99, action='x', state='done')
+        ep = self.endpoint()
+        ep.get_schema('node')
+        ep.get_schema('task')
+        ep.nodes[1]
+
+        self.server.reset_stats()
+        table = str(ep.tasks)
+        self.assertTrue('node-7' in table)
+        self.assertTrue('99 [orphaned]' in table)
+        self.assertEqual(self.server.requests,
+                         [('GET', '/tasks/'), ('POST', '/nodes/filter')])
+
+        # only the orphan is still unknown the second time round
+        self.server.reset_stats()
+        str(ep.tasks)
+        self.assertEqual(self.server.requests, [('POST', '/nodes/filter')])
+
+    def test_columnar_tables(self):
+        for i in range(2, 50):
+            self.server.add('tasks', id=i, node_id=1 + i % 2, action='x',
+                            state='done', result={'result_code': 0})
+        ep = self.endpoint(columnar=True)
+
+        tasks = ep.tasks.values()
+        row = ep.tasks[7]
+        self.assertTrue(isinstance(row, opencenterclient.columnar.Row))
+        self.assertEqual((row.id, row.node_id, row.state), (7, 2, 'done'))
+        self.assertTrue(row.success)
+        self.assertEqual(row.node.name, 'unprovisioned')
+        self.assertEqual(row.to_hash()['action'], 'x')
+        self.assertEqual(len(tasks), 49)
+        self.assertTrue('unprovisioned' in str(ep.tasks))
+
+        # equal strings are stored once
+        states = ep.tasks.dict[1].store.columns['state']
+        self.assertTrue(all(x is states[0] for x in states))
+
+        row.state = 'cancelled'
+        row.save()
+        self.assertEqual(ep.tasks[7].state, 'cancelled')
+        self.assertEqual(self.server.store['tasks'][7]['state'], 'cancelled')
+
+    def test_generated_object_classes(self):
+        ep = self.endpoint()
+        task = ep.tasks[1]
+        cls = type(task)
+        self.assertTrue(issubclass(cls,
+                                   opencenterclient.client.OpenCenterTask))
+        self.assertTrue(isinstance(ep.tasks.new(), cls))
+        self.assertTrue(isinstance(cls.__dict__['state'],
+                                   opencenterclient.client.Field))
+        self.assertTrue(task.node is ep.nodes[2])
+        self.assertTrue(task.success)
+
+        task.result = '{"result_code": 1}'
+        self.assertEqual(task.result, {'result_code': 1})
+        self.assertEqual(task.changed_fields, set(['result']))
+        self.assertRaises(AttributeError, setattr, task, 'bogus', 1)
+        self.assertRaises(AttributeError, getattr, task, 'bogus')
+
+        # types without their own class get a generated generic one
+        fact = ep.facts.new(node_id=2, key='k', value='"v"')
+        self.assertEqual(fact.value, 'v')
+        self.assertTrue(fact.node is ep.nodes[2])
+
+    def test_json_fields_decoded_lazily(self):
+        ep = self.endpoint()
+        node = ep.nodes[2]
+        node.attrs = '{"backends": ["node", "agent"]}'
+        self.assertTrue(isinstance(node.attributes['attrs'],
+                                   opencenterclient.client.RawJSON))
+
+        # saving sends the text as it was given
+        node.save()
+        self.assertEqual(self.server.store['nodes'][2]['attrs'],
+                         {'backends': ['node', 'agent']})
+
+        node.attrs = '{"x": 1}'
+        self.assertEqual(node.attrs, {'x': 1})
+        self.assertEqual(node.attributes['attrs'], {'x': 1})
+
+        # text that isn't json stays a string, as before
+        node.attrs = 'not json'
+        self.assertEqual(node.to_hash()['attrs'], 'not json')
+        node.save()
+        self.assertEqual(self.server.store['nodes'][2]['attrs'], 'not json')
+
+        copied = node.to_hash()
+        copied['name'] = 'other'
+        self.assertEqual(node.name, 'unprovisioned')
+
+        # sorted output sorts raw members in with the rest
+        raw = opencenterclient.client.RawJSON
+        self.assertEqual(
+            opencenterclient.client.dumps_attributes(
+                {'b': {'y': 1, 'x': 2}, 'a': raw('[1]'), 'c': raw('x')},
+                sort_keys=True),
+            '{"a": [1], "b": {"x": 2, "y": 1}, "c": "x"}')
+
+    def test_table_renderer_streams(self):
+        for i in range(2, 40):
+            self.server.add('tasks', id=i, node_id=1 + i % 2, action='x',
+                            state='done' if i < 30 else 'a-much-longer-state')
+        ep = self.endpoint(streaming=True)
+        expected = str(ep.tasks)
+        self.assertTrue(expected.startswith('id |'))
+        self.assertEqual(len(expected.splitlines()), 41)
+
+        class Out(object):
+            def __init__(self):
+                self.lines = []
+
+            def write(self, text):
+                self.lines.append(text)
+
+        # the header and the sampled rows are out before the rest arrive
+        out = Out()
+        written = []
+
+        def rows():
+            for i, row in enumerate(ep.tasks):
+                if i == 10:
+                    written.append(len(out.lines))
+                yield row
+
+        renderer = opencenterclient.output.TableRenderer(ep.tasks, out,
+                                                         sample=5)
+        renderer.render(rows())
+        self.assertEqual(written, [7])
+        self.assertEqual(len(out.lines), 41)
+        self.assertTrue('a-... |' in ''.join(out.lines))
+
+        out = Out()
+        ep.tasks.render(out, widths={'state': 8})
+        self.assertTrue('a-mu... |' in ''.join(out.lines))
+        self.assertEqual(ep.tasks.cached_keys(), [])
+
+    def test_record_output(self):
+        from StringIO import StringIO
+        self.server.add('tasks', id=2, node_id=1, action='x', state='done',
+                        result={'result_code': 1, 'result_str': u'\xe9'})
+        ep = self.endpoint()
+        schema = ep.get_schema('task')
+        fields = opencenterclient.output.record_fields(schema)
+        self.assertEqual(fields[0], 'id')
+        self.assertEqual(fields[1:], sorted(fields[1:]))
+
+        out = StringIO()
+        opencenterclient.output.RecordWriter(out, 'jsonl', fields).write_all(
+            ep.tasks)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['result']['result_str'],
+                         u'\xe9')
+        self.assertFalse(' ' in lines[0])
+
+        # fk columns stay ids, with no lookups of their names
+        requests = len(self.server.requests)
+        for fmt, sep in (('csv', ','), ('tsv', '\t')):
+            out = StringIO()
+            writer = opencenterclient.output.RecordWriter(out, fmt, fields)
+            writer.write_all(ep.tasks)
+            lines = out.getvalue().splitlines()
+            self.assertEqual(lines[0], sep.join(fields))
+            self.assertEqual(len(lines), 3)
+            row = dict(zip(fields, lines[2].split(sep)))
+            self.assertEqual(row['node_id'], '1')
+            self.assertEqual(row['payload'], '')
+        self.assertEqual(len(self.server.requests), requests)
+
+        # json fields set from text are written decoded
+        task = ep.tasks[2]
+        task.result = '{"result_code": 2}'
+        out = StringIO()
+        opencenterclient.output.RecordWriter(out, 'jsonl', fields).write(task)
+        self.assertEqual(json.loads(out.getvalue())['result'],
+                         {'result_code': 2})
+
+        self.assertRaises(ValueError, opencenterclient.output.RecordWriter,
+                          out, 'xml', fields)
+
+    def test_paged_iteration(self):
+        for i in range(2, 26):
+            self.server.add('tasks', id=i, node_id=1 + i % 2, action='x',
+                            state='done')
+        # a gap in the ids, then a few more
+        for i in range(100, 104):
+            self.server.add('tasks', id=i, node_id=1, action='x',
+                            state='done')
+        ep = self.endpoint()
+        ep.get_schema('task')
+
+        self.server.reset_stats()
+        pages = list(ep.tasks.iter_pages(10))
+        self.assertTrue(max([len(p) for p in pages]) <= 10)
+        ids = [x.id for p in pages for x in p]
+        self.assertEqual(ids, range(1, 26) + range(100, 104))
+        # nothing is kept in the table
+        self.assertEqual(ep.tasks.cached_keys(), [])
+        # the gap costs a handful of requests, not one per empty page
+        self.assertTrue(len(self.server.requests) <= 12)
+
+        # a scan can stop early without reading the rest
+        self.server.reset_stats()
+        pages = ep.tasks.iter_pages(5)
+        self.assertEqual([x.id for x in next(pages)], range(1, 5))
+        pages.close()
+        self.assertEqual(len(self.server.requests), 1)
+
+        # filters are paged within
+        odd = ep.tasks.filter('node_id=2')
+        self.assertEqual([x.id for x in odd.iter_paged(10)],
+                         range(1, 26, 2))
+
+        # objects are the live ones
+        self.assertTrue(next(ep.tasks.iter_paged(10)) is ep.tasks[1])
+
+        # a dense run after a gap still comes a page at a time
+        for i in range(200, 500):
+            self.server.add('tasks', id=i, node_id=1, action='x',
+                            state='done')
+        self.server.reset_stats()
+        pages = list(ep.tasks.iter_pages(10))
+        self.assertEqual([len(p) for p in pages],
+                         [9, 10, 6, 4] + [10] * 30)
+        ids = [x.id for p in pages for x in p]
+        self.assertEqual(ids,
+                         range(1, 26) + range(100, 104) + range(200, 500))
+        self.assertTrue(len(self.server.requests) <= 40)
+
+    def test_paged_tables(self):
+        for i in range(2, 50):
+            self.server.add('tasks', id=i, node_id=1, action='x',
+                            state='done')
+        ep = self.endpoint(page_size=10)
+        ep.get_schema('task')
+
+        self.server.reset_stats()
+        self.assertEqual(ep.tasks.first().id, 1)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.assertEqual(sorted([x.id for x in ep.tasks]), range(1, 50))
+        self.assertEqual(ep.tasks.cached_keys(), [])
+        view = ep.tasks.filter('id > 40')
+        self.assertEqual(view.page_size, 10)
+        self.assertEqual([x.id for x in view], range(41, 50))
+
+        # once the whole table is loaded, it is iterated from memory
+        self.assertEqual(len(ep.tasks.keys()), 49)
+        self.server.reset_stats()
+        self.assertEqual(len(list(ep.tasks)), 49)
+        self.assertEqual(self.server.requests, [])
+
+    def test_wait_for_complete_backs_off(self):
+        self.server.add('tasks', id=2, node_id=1, action='x',
+                        state='pending')
+        ep = self.endpoint()
+        task = ep.tasks[2]
+
+        def set_state(state):
+            self.server.store['tasks'][2]['state'] = state
+        threading.Timer(0.3, set_state, ['running']).start()
+        threading.Timer(0.9, set_state, ['done']).start()
+
+        seen = []
+        waiter = task.wait_for_complete(
+            on_change=lambda t: seen.append(t.state),
+            initial_delay=0.05, max_delay=0.2)
+        self.assertTrue(task.complete)
+        self.assertEqual(seen, ['pending', 'running', 'done'])
+        self.assertEqual(waiter.states, seen)
+        # a server that answers polls at once gets backoff, not a loop
+        polls = [x for x in self.server.requests if x[1].endswith('?poll')]
+        self.assertEqual(waiter.requests, len(polls) + 1)
+        self.assertTrue(waiter.requests < 20, waiter.requests)
+        self.assertTrue(waiter.elapsed >= 0.9)
+
+        # delays grow up to the maximum, with jitter
+        delays = opencenterclient.waiter.backoff_delays(1, 4)
+        delays = [next(delays) for i in range(5)]
+        self.assertTrue(0.5 <= delays[0] <= 1)
+        self.assertTrue(1 <= delays[1] <= 2)
+        self.assertTrue(all([2 <= x <= 4 for x in delays[3:]]))
+
+    def test_wait_for_complete_deadline(self):
+        self.server.add('tasks', id=2, node_id=1, action='x',
+                        state='running')
+        ep = self.endpoint()
+        task = ep.tasks[2]
+
+        start = time.time()
+        waiter = opencenterclient.waiter.TaskWaiter(task, timeout=0.3,
+                                                    initial_delay=0.1)
+        self.assertRaises(RuntimeError, waiter.wait)
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertTrue(waiter.requests < 8, waiter.requests)
+
+        # the deadline also cuts short a poll the server holds open
+        self.server.poll_delay = 2
+        start = time.time()
+        self.assertRaises(RuntimeError, task.wait_for_complete, timeout=0.3)
+        self.assertTrue(time.time() - start < 1)
+
+    def test_wait_for_complete_long_poll(self):
+        self.server.add('tasks', id=2, node_id=1, action='x',
+                        state='running')
+        ep = self.endpoint()
+        task = ep.tasks[2]
+        self.server.poll_delay = 1.1
+        threading.Timer(
+            1.5, lambda: self.server.store['tasks'][2].update(state='done')
+        ).start()
+
+        # polls held open by the server are followed straight away,
+        # without waiting out the backoff
+        start = time.time()
+        waiter = task.wait_for_complete(initial_delay=5)
+        self.assertTrue(task.complete)
+        self.assertEqual(waiter.requests, 3)
+        self.assertTrue(time.time() - start < 3)
+
+    def test_watch_tasks(self):
+        for i in range(2, 32):
+            self.server.add('tasks', id=i, node_id=1, action='x',
+                            state='running')
+        ep = self.endpoint()
+        ep.get_schema('task')
+        held = ep.tasks[5]
+        last = ep.tasks[31]
+
+        def finish(ids):
+            for i in ids:
+                self.server.store['tasks'][i]['state'] = 'done'
+        threading.Timer(0.2, finish, [range(2, 12)]).start()
+        threading.Timer(0.5, finish, [range(12, 32)]).start()
+
+        self.server.reset_stats()
+        sent = ep.requests.request_count
+        changes = []
+        watcher = ep.watch_tasks([1] + range(2, 31) + [last],
+                                 initial_delay=0.05, max_delay=0.1,
+                                 on_change=changes.append)
+        done = []
+        for task in watcher:
+            done.append(task.id)
+        self.assertEqual(sorted(done), range(1, 32))
+        # task 1 was already done
+        self.assertEqual(done[0], 1)
+        self.assertEqual(set(done[1:11]), set(range(2, 12)))
+        self.assertEqual(len(changes), 31 + 30)
+        # the objects already handed out are the ones updated
+        self.assertEqual(held.state, 'done')
+
+        # one request a round, whatever the number of tasks
+        self.assertEqual(ep.requests.request_count - sent, watcher.requests)
+        self.assertTrue(watcher.requests < 20, watcher.requests)
+        self.assertTrue(all([x[1] == '/tasks/filter'
+                             for x in self.server.requests]))
+
+        self.server.add('tasks', id=40, node_id=1, action='x',
+                        state='running')
+        watcher = ep.watch_tasks([40], timeout=0.3, initial_delay=0.05)
+        self.assertRaises(RuntimeError, watcher.wait)
+        self.assertRaises(KeyError, ep.watch_tasks([99]).wait)
+
+    def test_follow_logs(self):
+        self.server.add('tasks', id=2, node_id=1, action='x',
+                        state='running')
+        self.server.logs[2] = 'starting\n'
+        ep = self.endpoint()
+        task = ep.tasks[2]
+
+        lines = ['line %d\n' % i for i in range(20)]
+
+        def log(i):
+            self.server.logs[2] += lines[i]
+        for i in range(20):
+            threading.Timer(0.05 * i, log, [i]).start()
+
+        def finish():
+            self.server.logs[2] += 'finished\n'
+            self.server.store['tasks'][2]['state'] = 'done'
+        threading.Timer(1.2, finish).start()
+
+        self.server.reset_stats()
+        follower = task.follow_logs(initial_delay=0.05, max_delay=0.2)
+        text = ''.join(follower)
+        self.assertEqual(text, self.server.logs[2])
+        self.assertTrue(task.complete)
+        # each byte of the log was sent once
+        logs = [x for x in self.server.requests if '/logs' in x[1]]
+        self.assertTrue(all(['offset=%2B' in x[1] for x in logs]))
+        self.assertTrue(text.endswith('line 19\nfinished\n'))
+        tasks = len(self.server.requests) - len(logs)
+        self.assertTrue(self.server.bytes_sent < len(text) + 200 * tasks)
+        self.assertTrue(follower.requests < 40, follower.requests)
+
+        # a negative offset starts that far back from the end
+        follower = task.follow_logs(offset=-8)
+        self.assertEqual(''.join(follower), text[-8:])
+        self.assertEqual(''.join(task.follow_logs(offset=-10000)), text)
+
+    def test_stream_log(self):
+        self.server.logs[1] = ''.join(['line %d\n' % i for i in range(5000)])
+        ep = self.endpoint()
+        task = ep.tasks[1]
+
+        class Out(object):
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, chunk):
+                self.chunks.append(chunk)
+
+        out = Out()
+        written = task.stream_log(out, chunk_size=1024)
+        self.assertEqual(''.join(out.chunks), self.server.logs[1])
+        self.assertEqual(written, len(self.server.logs[1]))
+        self.assertTrue(max([len(x) for x in out.chunks]) <= 1024)
+
+        out = Out()
+        task.stream_log(out, offset='-10')
+        self.assertEqual(''.join(out.chunks), self.server.logs[1][-10:])
+        # the connection goes back to the pool for the next request
+        self.assertEqual(ep.tasks[1].id, 1)
+
+        # a task that has gone away raises rather than writing the error
+        missing = ep.tasks.new(id=99)
+        out = Out()
+        self.assertRaises(requests.exceptions.HTTPError,
+                          missing.stream_log, out)
+        self.assertEqual(out.chunks, [])
+        self.assertEqual(ep.tasks[1].id, 1)
+
+    def test_bulk_writes(self):
+        for i in range(3, 41):
+            self.server.add('nodes', id=i, name='node-%d' % i)
+        ep = self.endpoint(pool_size=8)
+        ep.get_schema('fact')
+        ep.get_schema('node')
+        nodes = ep.nodes.values()
+        facts_view = ep.facts.filter('key="role"')
+        self.assertEqual(len(facts_view.values()), 0)
+
+        self.server.delay = 0.05
+        self.server.reset_stats()
+        start = time.time()
+        results = ep.facts.bulk_create(
+            [{'node_id': x.id, 'key': 'role', 'value': 'compute'}
+             for x in nodes])
+        elapsed = time.time() - start
+        self.assertEqual(len(results), 40)
+        self.assertTrue(all(results))
+        self.assertEqual([x.status_code for x in results], [201] * 40)
+        self.assertEqual([x.obj.node_id for x in results],
+                         [x.id for x in nodes])
+        # the writes overlap: one at a time they would take 40 * 0.05s.
+        # the bound leaves room for a loaded single cpu
+        self.assertTrue(elapsed < 40 * 0.05 * 0.75, elapsed)
+        self.assertTrue(len(self.server.ports) > 1)
+        self.assertEqual(len(self.server.requests), 40)
+
+        # the new facts are in the table and the view is refetched once;
+        # the nodes they hang off are revalidated
+        self.server.delay = 0
+        self.server.reset_stats()
+        fact = results[0].obj
+        self.assertTrue(ep.facts[fact.id] is fact)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(len(facts_view.values()), 40)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(1 in ep.nodes.stale)
+
+        ids = [x.obj.id for x in results]
+        updated = ep.facts.bulk_update(
+            dict((x, {'value': 'storage'}) for x in ids[:10] + [999]))
+        self.assertEqual([x.status_code for x in updated],
+                         [200] * 10 + [404])
+        self.assertFalse(updated[-1])
+        self.assertEqual(fact.value, 'storage')
+        self.assertEqual(self.server.store['facts'][ids[9]]['value'],
+                         'storage')
+        self.assertEqual(self.server.store['facts'][ids[10]]['value'],
+                         'compute')
+
+        fact.value = 'network'
+        self.assertTrue(all(ep.facts.bulk_update([fact])))
+        self.assertEqual(fact.changed_fields, set())
+
+        # ids may come as strings, as they do from argv
+        deleted = ep.facts.bulk_delete(ids[:19] + [str(ids[19]),
+                                                   ep.facts[ids[20]]])
+        self.assertTrue(all(deleted))
+        self.assertRaises(TypeError, ep.facts.bulk_delete, ['x'])
+        self.assertRaises(TypeError, ep.facts.bulk_delete, [{'id': 1}])
+        self.assertEqual(len(self.server.store['facts']), 19)
+        self.assertFalse(ids[0] in ep.facts.cached_keys())
+        self.assertEqual(len(facts_view.values()), 19)
@@ -1,7 +1,13 @@
+import os
+import sys
+import tempfile
 import unittest
+from StringIO import StringIO
 import opencenterclient
 import opencenterclient.shell
 
+from tests.fakeserver import FakeServer
+
 
 class TestShell(unittest.TestCase):
 
@@ -39,3 +45,77 @@ class TestShell(unittest.TestCase):
 
         #deep merge test
         self.assertEqual(c, opencenterclient.shell.deep_update(a, b))
+
+    def test_parser_per_noun(self):
+        argvs = [['node', 'list'],
+                 ['task', 'logs', '5', '-f', '--output', 'jsonl'],
+                 ['node', 'show', '2', '--property', 'name'],
+                 ['fact', 'create', '1', 'task', '"x"'],
+                 ['--debug', 'task', 'show', '3'],
+                 ['--endpoint', 'node', 'task', 'list']]
+        full = opencenterclient.shell.OpenCenterShell().build_parser()
+        shell = opencenterclient.shell.OpenCenterShell()
+        for argv in argvs:
+            self.assertEqual(full.parse_args(argv), shell.parse_args(argv))
+
+        # only the nouns run were built, and built once
+        self.assertEqual(sorted(shell.parsers), ['fact', 'node', 'task'])
+        node_parser = shell.parsers['node']
+        shell.parse_args(['node', 'delete', '1'])
+        self.assertTrue(shell.parsers['node'] is node_parser)
+
+    def run_batch(self, server, lines, *options):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        os.write(fd, '\n'.join(lines) + '\n')
+        os.close(fd)
+
+        shell = opencenterclient.shell.OpenCenterShell()
+        out, err = StringIO(), StringIO()
+        sys.stdout, sys.stderr = out, err
+        try:
+            shell.main(['batch', path, '--endpoint', server.url,
+                        '--no-schema-cache'] + list(options))
+            status = 0
+        except SystemExit, e:
+            status = e.code
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        return status, out.getvalue(), err.getvalue()
+
+    def test_batch(self):
+        server = FakeServer().start()
+        self.addCleanup(server.stop)
+        server.add('nodes', id=1, name='workspace')
+        server.add('nodes', id=2, name='unprovisioned')
+
+        status, out, err = self.run_batch(server, [
+            '# provisioning',
+            'node list',
+            '',
+            'node show workspace --property name',
+            'node show 2 --output jsonl'])
+        self.assertEqual(status, 0)
+        self.assertTrue('unprovisioned' in out)
+        self.assertTrue('"workspace"' in out)
+        self.assertTrue('"id":2,"name":"unprovisioned"}' in out)
+        # one endpoint, one schema fetch, for every command
+        self.assertEqual(len([x for x in server.requests
+                              if x[1] == '/schema']), 1)
+        self.assertTrue(err.startswith('3 commands (0 failed), %d requests'
+                                       % len(server.requests)))
+
+        # stop at the first failure, unless told to keep going
+        status, out, err = self.run_batch(
+            server, ['node show nosuchnode', 'node lst', 'node list'])
+        self.assertEqual(status, 1)
+        self.assertFalse('workspace' in out)
+        self.assertTrue('stopping at line 1' in err)
+
+        status, out, err = self.run_batch(
+            server, ['node show nosuchnode', 'node lst', 'batch',
+                     'node list'], '--keep-going')
+        self.assertEqual(status, 1)
+        self.assertTrue('workspace' in out)
+        self.assertTrue('line 3: batches cannot be nested' in err)
+        self.assertTrue('4 commands (3 failed)' in err)
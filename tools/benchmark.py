@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+#               OpenCenter(TM) is Copyright 2013 by Rackspace US, Inc.
+##############################################################################
+#
+# OpenCenter is licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.  This
+# version of OpenCenter includes Rackspace trademarks and logos, and in
+# accordance with Section 6 of the License, the provision of commercial
+# support services in conjunction with a version of OpenCenter which includes
+# Rackspace trademarks and logos is prohibited.  OpenCenter source code and
+# details are available at: # https://github.com/rcbops/opencenter or upon
+# written request.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0 and a copy, including this
+# notice, is available in the LICENSE file accompanying this software.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the # specific language governing permissions and limitations
+# under the License.
+#
+##############################################################################
+"""Benchmarks for opencenter-client.
+
+Everything runs against the stand-in server from tests/fakeserver.py,
+so no OpenCenter install is needed:
+
+    python tools/benchmark.py startup --runs 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from tests.fakeserver import FakeServer
+
+
+def _summary(label, samples, unit='ms', scale=1000.0):
+    samples = sorted(samples)
+    print '%-32s min %8.1f%s  median %8.1f%s  max %8.1f%s' % (
+        label,
+        samples[0] * scale, unit,
+        samples[len(samples) / 2] * scale, unit,
+        samples[-1] * scale, unit)
+
+
+def _populate(server, nodes=10, tasks=0):
+    for i in range(nodes):
+        server.add('nodes', name='node-%d' % i,
+                   attrs={'backends': ['node', 'agent'],
+                          'opencenter_agent_output_modules': ['facts']},
+                   facts={'parent_id': 1})
+    for i in range(tasks):
+        server.add('tasks', node_id=(i % nodes) + 1, action='rollback',
+                   state='done', payload={},
+                   result={'result_code': 0, 'result_str': 'ok',
+                           'result_data': {}})
+
+
+def _cli(server, argv, env=None):
+    run_env = dict(os.environ)
+    run_env.update(env or {})
+    run_env['OPENCENTER_ENDPOINT'] = server.url
+    run_env['PYTHONPATH'] = ROOT
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.Popen(
+            [sys.executable, '-c',
+             'from opencenterclient.shell import main; main()'] + argv,
+            env=run_env, stdout=devnull)
+
+
+def _run_client(server, script, env=None):
+    """Run client code in a child process, so its cpu time and peak
+    memory are not mixed up with the server's.  The script reports its
+    results by setting a 'results' dict."""
+    run_env = dict(os.environ)
+    run_env.update(env or {})
+    run_env['PYTHONPATH'] = ROOT
+    wrapper = '\n'.join([
+        'import json, os, resource, time',
+        'from opencenterclient.client import OpenCenterEndpoint',
+        'ep = OpenCenterEndpoint(%r)' % server.url,
+        'results = {}',
+        'start, cpu_start = time.time(), time.clock()',
+        script,
+        'results["wall"] = time.time() - start',
+        'results["cpu"] = time.clock() - cpu_start',
+        'results["maxrss_kb"] = resource.getrusage(',
+        '    resource.RUSAGE_SELF).ru_maxrss',
+        # on linux ru_maxrss counts the parent's memory from before the
+        # exec, and the parent here holds everything the server serves
+        'if os.path.exists("/proc/self/status"):',
+        '    for line in open("/proc/self/status"):',
+        '        if line.startswith("VmHWM:"):',
+        '            results["maxrss_kb"] = int(line.split()[1])',
+        'print json.dumps(results)'])
+    out = subprocess.Popen([sys.executable, '-c', wrapper], env=run_env,
+                           stdout=subprocess.PIPE).communicate()[0]
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def bench_list(args):
+    """Fetch and build a large task collection."""
+    server = FakeServer().start()
+    _populate(server, nodes=10, tasks=args.tasks)
+
+    script = 'n = len(ep.tasks.values())'
+    for label, env in [('debug off', {}),
+                       ('debug on, curl', {'BENCH_DEBUG': 'curl'}),
+                       ('debug on, structured',
+                        {'BENCH_DEBUG': 'structured'})]:
+        setup = ''
+        if env:
+            setup = '\n'.join([
+                'import logging, os',
+                'logging.getLogger("opencenter").addHandler(',
+                '    logging.FileHandler(os.devnull))',
+                'logging.getLogger("opencenter").setLevel(logging.DEBUG)',
+                'ep.requests.log_format = os.environ["BENCH_DEBUG"]'])
+        runs = [_run_client(server, '\n'.join([setup, script]), env)
+                for i in range(args.runs)]
+        _summary('%s: wall' % label, [x['wall'] for x in runs])
+        _summary('%s: cpu' % label, [x['cpu'] for x in runs])
+        _summary('%s: peak rss' % label, [x['maxrss_kb'] for x in runs],
+                 unit='M', scale=1 / 1024.0)
+
+    server.stop()
+
+
+def bench_stream(args):
+    """Iterate a large collection, loaded whole versus streamed."""
+    server = FakeServer().start()
+    _populate(server, nodes=10, tasks=args.tasks)
+
+    script = '\n'.join([
+        'ep.tasks.streaming = STREAMING',
+        'rows = iter(ep.tasks)',
+        'next(rows)',
+        'results["first_row"] = time.time() - start',
+        'n = 1 + sum(1 for x in rows)'])
+    for label, streaming in [('loaded', False), ('streamed', True)]:
+        runs = [_run_client(server,
+                            script.replace('STREAMING', str(streaming)))
+                for i in range(args.runs)]
+        _summary('%s: first row' % label, [x['first_row'] for x in runs])
+        _summary('%s: all rows' % label, [x['wall'] for x in runs])
+        _summary('%s: peak rss' % label, [x['maxrss_kb'] for x in runs],
+                 unit='M', scale=1 / 1024.0)
+
+    server.stop()
+
+
+def bench_download(args):
+    """Fetch a large task log, read whole versus streamed to a file."""
+    server = FakeServer().start()
+    _populate(server, nodes=1)
+    server.add('tasks', id=1, node_id=1, action='rollback', state='done')
+    line = 'x' * 99 + '\n'
+    server.logs[1] = line * (args.mb * 1024 * 1024 / len(line))
+
+    for label, script in [
+            ('whole', '\n'.join([
+                'import os',
+                'with open(os.devnull, "wb") as out:',
+                '    out.write(ep.tasks[1]._logtail())'])),
+            ('streamed', '\n'.join([
+                'import os',
+                'with open(os.devnull, "wb") as out:',
+                '    ep.tasks[1].stream_log(out)']))]:
+        runs = [_run_client(server, script) for i in range(args.runs)]
+        _summary('%s: wall' % label, [x['wall'] for x in runs])
+        _summary('%s: peak rss' % label, [x['maxrss_kb'] for x in runs],
+                 unit='M', scale=1 / 1024.0)
+
+    server.stop()
+
+
+def deep_size(root, shared=()):
+    """Bytes held by everything reachable from root, by sys.getsizeof.
+
+    Python 2 has no tracemalloc, so this stands in for it.  Objects of
+    the types in shared (the endpoint, schemas, loggers) are counted as
+    references only.
+    """
+    seen = set()
+    total = 0
+    todo = [root]
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen or isinstance(obj, shared):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            todo.extend(obj.keys())
+            todo.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            todo.extend(obj)
+        elif hasattr(obj, 'func_closure'):
+            todo.extend(cell.cell_contents for cell in obj.func_closure or ())
+        else:
+            if hasattr(obj, '__dict__'):
+                todo.append(obj.__dict__)
+            for slot in getattr(type(obj), '__slots__', ()):
+                todo.append(getattr(obj, slot, None))
+    return total
+
+
+def bench_memory(args):
+    """Memory held by a large task table, as objects versus columns."""
+    server = FakeServer().start()
+    _populate(server, nodes=10, tasks=args.tasks)
+
+    script = '\n'.join([
+        'import logging, sys',
+        'sys.path.insert(0, %r)' % os.path.join(ROOT, 'tools'),
+        'from benchmark import deep_size',
+        'from opencenterclient.client import ObjectSchema, '
+        'OpenCenterEndpoint',
+        'ep.tasks.columnar = COLUMNAR',
+        'n = len(ep.tasks.values())',
+        'results["held_kb"] = deep_size(ep.tasks.dict, (',
+        '    OpenCenterEndpoint, ObjectSchema, logging.Logger)) / 1024'])
+    for label, columnar in [('objects', False), ('columnar', True)]:
+        runs = [_run_client(server,
+                            script.replace('COLUMNAR', str(columnar)))
+                for i in range(args.runs)]
+        _summary('%s: held by table' % label, [x['held_kb'] for x in runs],
+                 unit='M', scale=1 / 1024.0)
+        _summary('%s: peak rss' % label, [x['maxrss_kb'] for x in runs],
+                 unit='M', scale=1 / 1024.0)
+        _summary('%s: load time' % label, [x['wall'] for x in runs])
+
+    server.stop()
+
+
+def _synthetic_tasks(count):
+    return {'tasks': [{'id': i,
+                       'node_id': i % 50,
+                       'action': 'adventurate',
+                       'state': 'done',
+                       'payload': {'adventure_dsl': [{'ns': {},
+                                                      'primitive': 'noop'}],
+                                   'adventure_globals': {}},
+                       'result': {'result_code': 0,
+                                  'result_str': 'success',
+                                  'result_data': {'history': ['x' * 64] * 4}}}
+                      for i in range(count)]}
+
+
+def bench_json(args):
+    """Compare json decoders on a large synthetic collection."""
+    from opencenterclient.client import JSON_DECODERS, _import_json_decoder
+
+    body = json.dumps(_synthetic_tasks(args.tasks))
+    print '%d tasks, %.1fMB body' % (args.tasks, len(body) / 1048576.0)
+
+    for name in JSON_DECODERS:
+        loads = _import_json_decoder(name)
+        if loads is None:
+            print '%-32s not installed' % name
+            continue
+
+        samples = []
+        for run in range(args.runs):
+            start = time.time()
+            loads(body)
+            samples.append(time.time() - start)
+        _summary(name, samples)
+
+    # requests' own response.json() decodes the body to text first,
+    # which also holds a unicode copy of the whole body in memory
+    samples = []
+    for run in range(args.runs):
+        start = time.time()
+        text = body.decode('utf-8')
+        json.loads(text)
+        samples.append(time.time() - start)
+    _summary('json, via response text', samples)
+    print '%-32s %.1fMB extra for the text copy' % (
+        '', sys.getsizeof(text) / 1048576.0)
+
+
+def bench_attrs(args):
+    """Attribute get/set and col_format on plain and generated classes."""
+    from opencenterclient.client import OpenCenterEndpoint, OpenCenterTask
+
+    server = FakeServer().start()
+    _populate(server, nodes=1)
+    ep = OpenCenterEndpoint(server.url)
+    item = {'id': 1, 'node_id': 1, 'action': 'rollback', 'state': 'done',
+            'payload': {}, 'result': {'result_code': 0}}
+
+    objects = [('plain', OpenCenterTask(endpoint=ep)),
+               ('generated', ep._new_object('task'))]
+    for label, obj in objects:
+        obj.attributes = dict(item)
+
+        def _get():
+            for i in xrange(args.loops):
+                obj.state
+                obj.node_id
+
+        def _set():
+            for i in xrange(args.loops):
+                obj.state = 'done'
+                obj.node_id = 1
+
+        def _col_format():
+            for i in xrange(args.loops / 10):
+                obj.col_format()
+
+        for name, fn in [('get', _get), ('set', _set),
+                         ('col_format', _col_format)]:
+            samples = []
+            for run in range(args.runs):
+                start = time.time()
+                fn()
+                samples.append(time.time() - start)
+            _summary('%s: %s' % (label, name), samples)
+
+    ep.requests.close()
+    server.stop()
+
+
+def bench_startup(args):
+    """Time from launching opencentercli to its first real request."""
+    server = FakeServer().start()
+    _populate(server)
+
+    first_request = []
+    total = []
+    request_counts = []
+    for run in range(args.runs):
+        server.reset_stats()
+        start = time.time()
+        _cli(server, args.command.split()).wait()
+        total.append(time.time() - start)
+        first_request.append(server.request_times[0] - start)
+        request_counts.append(len(server.requests))
+
+    server.stop()
+
+    # argument parsing on its own, in process, as a fresh shell does it
+    from opencenterclient.shell import OpenCenterShell
+    parse = []
+    for run in range(args.runs):
+        start = time.time()
+        OpenCenterShell().parse_args(args.command.split())
+        parse.append(time.time() - start)
+
+    print 'opencentercli %s, %d runs, %d requests per run' % (
+        args.command, args.runs, max(request_counts))
+    _summary('parse arguments', parse)
+    _summary('launch to first request', first_request)
+    _summary('launch to exit', total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    benchmarks = parser.add_subparsers(dest='benchmark')
+
+    startup = benchmarks.add_parser('startup', help=bench_startup.__doc__)
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--command', default='node list',
+                         help='opencentercli arguments to time')
+    startup.set_defaults(func=bench_startup)
+
+    list_bench = benchmarks.add_parser('list', help=bench_list.__doc__)
+    list_bench.add_argument('--runs', type=int, default=3)
+    list_bench.add_argument('--tasks', type=int, default=20000)
+    list_bench.set_defaults(func=bench_list)
+
+    json_bench = benchmarks.add_parser('json', help=bench_json.__doc__)
+    json_bench.add_argument('--runs', type=int, default=5)
+    json_bench.add_argument('--tasks', type=int, default=50000)
+    json_bench.set_defaults(func=bench_json)
+
+    stream_bench = benchmarks.add_parser('stream', help=bench_stream.__doc__)
+    stream_bench.add_argument('--runs', type=int, default=3)
+    stream_bench.add_argument('--tasks', type=int, default=20000)
+    stream_bench.set_defaults(func=bench_stream)
+
+    attrs_bench = benchmarks.add_parser('attrs', help=bench_attrs.__doc__)
+    attrs_bench.add_argument('--runs', type=int, default=5)
+    attrs_bench.add_argument('--loops', type=int, default=100000)
+    attrs_bench.set_defaults(func=bench_attrs)
+
+    download = benchmarks.add_parser('download', help=bench_download.__doc__)
+    download.add_argument('--runs', type=int, default=3)
+    download.add_argument('--mb', type=int, default=200)
+    download.set_defaults(func=bench_download)
+
+    memory_bench = benchmarks.add_parser('memory', help=bench_memory.__doc__)
+    memory_bench.add_argument('--runs', type=int, default=1)
+    memory_bench.add_argument('--tasks', type=int, default=100000)
+    memory_bench.set_defaults(func=bench_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()